@@ -1,4 +1,5 @@
 from autogpt.agent.agent import Agent
 from autogpt.agent.agent_manager import AgentManager
+from autogpt.agent.scheduler import AgentRun, AgentScheduler
 
-__all__ = ["Agent", "AgentManager"]
+__all__ = ["Agent", "AgentManager", "AgentRun", "AgentScheduler"]
@@ -1,13 +1,18 @@
+import asyncio
+import copy
 import json
 import signal
 import sys
+import time
 from datetime import datetime
 
 from colorama import Fore, Style
 
 from autogpt.config import Config
 from autogpt.config.ai_config import AIConfig
-from autogpt.json_utils.utilities import extract_json_from_response, validate_json
+from autogpt.json_utils.incremental_parser import IncrementalJSONParser
+from autogpt.json_utils.utilities import extract_json_from_message, validate_json
+from autogpt.llm.base import Message
 from autogpt.llm.chat import chat_with_ai
 from autogpt.llm.providers.openai import OPEN_AI_CHAT_MODELS
 from autogpt.llm.utils import count_string_tokens
@@ -17,13 +22,13 @@ from autogpt.log_cycle.log_cycle import (
     USER_INPUT_FILE_NAME,
     LogCycleHandler,
 )
-from autogpt.logs import logger, print_assistant_thoughts
+from autogpt.logs import console_output, logger, print_assistant_thoughts
 from autogpt.memory.message_history import MessageHistory
 from autogpt.memory.vector import VectorMemory
 from autogpt.models.command_registry import CommandRegistry
 from autogpt.speech import say_text
 from autogpt.spinner import Spinner
-from autogpt.utils import clean_input
+from autogpt.utils import clean_input, run_in_thread
 from autogpt.workspace import Workspace
 
 
@@ -79,20 +84,56 @@ class Agent:
         self.workspace = Workspace(workspace_directory, config.restrict_to_workspace)
         self.created_at = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.cycle_count = 0
-        self.log_cycle_handler = LogCycleHandler()
+        self.log_cycle_handler = LogCycleHandler(
+            history_delta=config.log_cycle_history_delta,
+            jsonl=config.log_cycle_format == "jsonl.gz",
+        )
         self.fast_token_limit = OPEN_AI_CHAT_MODELS.get(
             config.fast_llm_model
         ).max_tokens
 
     def start_interaction_loop(self):
+        """Runs the interaction loop until it ends, see run_interaction_loop"""
+        asyncio.run(self.run_interaction_loop())
+
+    async def run_interaction_loop(self, handle_sigint: bool = True):
+        """
+        Runs the cycles of the agent until the user exits or the continuous limit is
+        reached. LLM calls, commands and prompts for user input run in threads, cycle
+        logs are written in the background and speech does not hold up the cycle. An
+        interrupt signal during continuous execution cancels the current cycle, once
+        the LLM call or commands that it is waiting for have returned.
+
+        Args:
+            handle_sigint (bool): Whether to install the interrupt signal handler.
+                Only one agent in a process can handle the signal.
+        """
         # Avoid circular imports
-        from autogpt.app import execute_command, get_command
+        from autogpt.app import execute_commands, get_commands
+
+        loop = asyncio.get_running_loop()
+        background_tasks: set[asyncio.Task] = set()
+
+        def log_cycle(data, file_name: str) -> None:
+            self.log_cycle_handler.log_cycle(
+                self.ai_config.ai_name,
+                self.created_at,
+                self.cycle_count,
+                data,
+                file_name,
+            )
+
+        def speak(text: str) -> None:
+            task = asyncio.create_task(run_in_thread(say_text, text, self.config))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
 
         # Interaction Loop
         self.cycle_count = 0
-        command_name = None
-        arguments = None
+        commands = [(None, None)]
         user_input = ""
+        cycle: asyncio.Task | None = None
+        exit_request: SystemExit | None = None
 
         # Signal handler for interrupting y -N
         def signal_handler(signum, frame):
@@ -105,20 +146,29 @@ class Agent:
                     + Style.RESET_ALL
                 )
                 self.next_action_count = 0
+                if cycle is not None:
+                    loop.call_soon_threadsafe(cycle.cancel)
 
-        signal.signal(signal.SIGINT, signal_handler)
+        if handle_sigint:
+            signal.signal(signal.SIGINT, signal_handler)
+
+        async def run_cycle_task() -> bool:
+            # SystemExit must not escape a task, it would stop the whole event loop
+            nonlocal exit_request
+            try:
+                return await run_cycle()
+            except SystemExit as e:
+                exit_request = e
+                return False
+
+        async def run_cycle() -> bool:
+            """Runs one cycle of the loop, returns False when the loop should end"""
+            nonlocal commands, user_input
 
-        while True:
             # Discontinue if continuous limit is reached
             self.cycle_count += 1
             self.log_cycle_handler.log_count_within_cycle = 0
-            self.log_cycle_handler.log_cycle(
-                self.ai_config.ai_name,
-                self.created_at,
-                self.cycle_count,
-                [m.raw() for m in self.history],
-                FULL_MESSAGE_HISTORY_FILE_NAME,
-            )
+            log_cycle([m.raw() for m in self.history], FULL_MESSAGE_HISTORY_FILE_NAME)
             if (
                 self.config.continuous_mode
                 and self.config.continuous_limit > 0
@@ -129,21 +179,49 @@ class Agent:
                     Fore.YELLOW,
                     f"{self.config.continuous_limit}",
                 )
-                break
+                return False
             # Send message to AI, get response
-            with Spinner("思考中... ", plain_output=self.config.plain_output):
-                assistant_reply = chat_with_ai(
+            reply_parser = IncrementalJSONParser()
+            thoughts_printed = False
+            with Spinner("思考中... ", plain_output=self.config.plain_output) as spinner:
+
+                def on_delta(delta: str) -> bool:
+                    nonlocal thoughts_printed
+                    for key, value in reply_parser.feed(delta):
+                        # Plugins may change the thoughts after planning
+                        if (
+                            key == "thoughts"
+                            and isinstance(value, dict)
+                            and not any(
+                                plugin.can_handle_post_planning()
+                                for plugin in self.config.plugins
+                            )
+                        ):
+                            spinner.stop()
+                            print_assistant_thoughts(
+                                self.ai_name, {"thoughts": value}, self.config
+                            )
+                            thoughts_printed = True
+                    return reply_parser.complete and not reply_parser.failed
+
+                assistant_reply = await run_in_thread(
+                    chat_with_ai,
                     self.config,
                     self,
                     self.system_prompt,
                     self.triggering_prompt,
                     self.fast_token_limit,
                     self.config.fast_llm_model,
+                    on_delta=on_delta if self.config.openai_streaming else None,
                 )
 
             try:
-                assistant_reply_json = extract_json_from_response(
-                    assistant_reply.content
+                # The parse is cached on the message in the history, which parses it
+                # again every cycle, so plugins and path resolution get a copy
+                assistant_reply_json = copy.deepcopy(
+                    extract_json_from_message(
+                        self._reply_message(assistant_reply.content)
+                    )
                 )
                 validate_json(assistant_reply_json, self.config)
             except json.JSONDecodeError as e:
@@ -159,35 +237,37 @@ class Agent:
             if assistant_reply_json != {}:
                 # Get command name and arguments
                 try:
-                    print_assistant_thoughts(
-                        self.ai_name, assistant_reply_json, self.config
-                    )
-                    command_name, arguments = get_command(
+                    if not thoughts_printed:
+                        print_assistant_thoughts(
+                            self.ai_name, assistant_reply_json, self.config
+                        )
+                    commands = get_commands(
                         assistant_reply_json, assistant_reply, self.config
                     )
                     if self.config.speak_mode:
-                        say_text(f"我想要执行命令 {command_name}")
+                        command_names = ", ".join(str(name) for name, _ in commands)
+                        speak(f"我想要执行命令 {command_names}")
 
-                    arguments = self._resolve_pathlike_command_args(arguments)
+                    commands = [
+                        (command_name, self._resolve_pathlike_command_args(arguments))
+                        if isinstance(arguments, dict)
+                        else (command_name, arguments)
+                        for command_name, arguments in commands
+                    ]
 
                 except Exception as e:
                     logger.error("错误: \n", str(e))
-            self.log_cycle_handler.log_cycle(
-                self.ai_config.ai_name,
-                self.created_at,
-                self.cycle_count,
-                assistant_reply_json,
-                NEXT_ACTION_FILE_NAME,
-            )
+            log_cycle(assistant_reply_json, NEXT_ACTION_FILE_NAME)
 
             # First log new-line so user can differentiate sections better in console
             logger.typewriter_log("\n")
-            logger.typewriter_log(
-                "NEXT ACTION: ",
-                Fore.CYAN,
-                f"COMMAND = {Fore.CYAN}{command_name}{Style.RESET_ALL}  "
-                f"ARGUMENTS = {Fore.CYAN}{arguments}{Style.RESET_ALL}",
-            )
+            for command_name, arguments in commands:
+                logger.typewriter_log(
+                    "NEXT ACTION: ",
+                    Fore.CYAN,
+                    f"COMMAND = {Fore.CYAN}{command_name}{Style.RESET_ALL}  "
+                    f"ARGUMENTS = {Fore.CYAN}{arguments}{Style.RESET_ALL}",
+                )
 
             if not self.config.continuous_mode and self.next_action_count == 0:
                 # ### GET USER AUTHORIZATION TO EXECUTE COMMAND ###
@@ -201,12 +281,14 @@ class Agent:
                 )
                 while True:
                     if self.config.chat_messages_enabled:
-                        console_input = clean_input(
-                            self.config, "等待你的反馈中..."
+                        console_input = await run_in_thread(
+                            clean_input, self.config, "等待你的反馈中..."
                         )
                     else:
-                        console_input = clean_input(
-                            self.config, Fore.MAGENTA + "输入:" + Style.RESET_ALL
+                        console_input = await run_in_thread(
+                            clean_input,
+                            self.config,
+                            Fore.MAGENTA + "输入:" + Style.RESET_ALL,
                         )
                     if console_input.lower().strip() == self.config.authorise_key:
                         user_input = "生成下一个命令的JSON"
@@ -234,14 +316,9 @@ class Agent:
                         break
                     else:
                         user_input = console_input
-                        command_name = "人类反馈"
-                        self.log_cycle_handler.log_cycle(
-                            self.ai_config.ai_name,
-                            self.created_at,
-                            self.cycle_count,
-                            user_input,
-                            USER_INPUT_FILE_NAME,
-                        )
+                        # The feedback replaces all the commands of the reply
+                        commands = [("human_feedback", None)]
+                        log_cycle(user_input, USER_INPUT_FILE_NAME)
                         break
 
                 if user_input == "生成下一个命令的JSON":
@@ -250,9 +327,9 @@ class Agent:
                         Fore.MAGENTA,
                         "",
                     )
-                elif user_input == "EXIT" or "exit" or "退出":
+                elif user_input == "EXIT":
                     logger.info("退出中...")
-                    break
+                    return False
             else:
                 # First log new-line so user can differentiate sections better in console
                 logger.typewriter_log("\n")
@@ -261,42 +338,62 @@ class Agent:
                     f"{Fore.CYAN}AUTHORISED COMMANDS LEFT: {Style.RESET_ALL}{self.next_action_count}"
                 )
 
-            # Execute command
-            if command_name is not None and command_name.lower().startswith("error"):
-                result = f"无法执行命令: {arguments}"
-            elif command_name == "human_feedback":
-                result = f"人类反馈: {user_input}"
-            else:
-                for plugin in self.config.plugins:
-                    if not plugin.can_handle_pre_command():
-                        continue
-                    command_name, arguments = plugin.pre_command(
-                        command_name, arguments
-                    )
-                command_result = execute_command(
-                    command_name=command_name,
-                    arguments=arguments,
-                    agent=self,
-                )
-                result = f"Command {command_name} returned: " f"{command_result}"
+            # Execute commands, the independent commands of one reply run at once
+            results: list[str | None] = [None] * len(commands)
+            to_execute: list[tuple[int, str, dict]] = []
+            for i, (command_name, arguments) in enumerate(commands):
+                if command_name is not None and command_name.lower().startswith(
+                    "error"
+                ):
+                    results[i] = f"无法执行命令: {arguments}"
+                elif command_name == "human_feedback":
+                    results[i] = f"人类反馈: {user_input}"
+                else:
+                    for plugin in self.config.plugins:
+                        if not plugin.can_handle_pre_command():
+                            continue
+                        command_name, arguments = plugin.pre_command(
+                            command_name, arguments
+                        )
+                    to_execute.append((i, command_name, arguments))
 
-                result_tlength = count_string_tokens(
-                    str(command_result), self.config.fast_llm_model
+            if to_execute:
+                command_results = await execute_commands(
+                    [(name, args) for _, name, args in to_execute], agent=self
                 )
-                memory_tlength = count_string_tokens(
-                    str(self.history.summary_message()), self.config.fast_llm_model
+                # The results of all commands must fit in the context together
+                available_tokens = (
+                    self.fast_token_limit
+                    - 600
+                    - count_string_tokens(
+                        str(self.history.summary_message()),
+                        self.config.fast_llm_model,
+                    )
                 )
-                if result_tlength + memory_tlength + 600 > self.fast_token_limit:
-                    result = f"Failure: command {command_name} returned too much output. \
-                        Do not execute this command again with the same arguments."
+                for (i, command_name, _), command_result in zip(
+                    to_execute, command_results
+                ):
+                    result = f"Command {command_name} returned: " f"{command_result}"
 
-                for plugin in self.config.plugins:
-                    if not plugin.can_handle_post_command():
-                        continue
-                    result = plugin.post_command(command_name, result)
+                    result_tlength = count_string_tokens(
+                        str(command_result), self.config.fast_llm_model
+                    )
+                    if result_tlength > available_tokens:
+                        result = f"Failure: command {command_name} returned too much output. \
+                            Do not execute this command again with the same arguments."
+                    else:
+                        available_tokens -= result_tlength
+
+                    for plugin in self.config.plugins:
+                        if not plugin.can_handle_post_command():
+                            continue
+                        result = plugin.post_command(command_name, result)
+                    results[i] = result
                 if self.next_action_count > 0:
                     self.next_action_count -= 1
 
+            result = "\n".join(filter(None, results)) or None
+
             # Check if there's a result from the command append it to the message
             # history
             if result is not None:
@@ -307,6 +404,42 @@ class Agent:
                 logger.typewriter_log(
                     "SYSTEM: ", Fore.YELLOW, "无法执行命令"
                 )
+            return True
+
+        try:
+            while True:
+                cycle_start = time.perf_counter()
+                console_output_start = console_output.time_spent
+                cycle = asyncio.create_task(run_cycle_task())
+                try:
+                    await asyncio.wait([cycle])
+                except asyncio.CancelledError:
+                    cycle.cancel()
+                    raise
+
+                if cycle.cancelled():
+                    logger.debug(f"Cycle {self.cycle_count} was cancelled")
+                    continue
+                # Typed console output is written alongside the cycle, not in it
+                console_output_time = console_output.time_spent - console_output_start
+                logger.debug(
+                    f"Cycle {self.cycle_count} took "
+                    f"{time.perf_counter() - cycle_start:.3f}s, console output "
+                    f"took {console_output_time:.3f}s"
+                )
+                if not cycle.result():
+                    break
+        finally:
+            await run_in_thread(self.log_cycle_handler.close)
+
+        if exit_request is not None:
+            raise exit_request
+
+    def _reply_message(self, content: str) -> Message:
+        """The AI message with a reply in the history, or a new one if it isn't there"""
+        if len(self.history) and self.history[-1].content == content:
+            return self.history[-1]
+        return Message("assistant", content, "ai_response")
 
     def _resolve_pathlike_command_args(self, command_args):
         if "directory" in command_args and command_args["directory"] in {"", "/"}:
@@ -0,0 +1,119 @@
+"""Runs many agents concurrently in one process"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from autogpt.agent.agent import Agent
+from autogpt.llm.api_manager import ApiManager
+from autogpt.logs import logger
+
+
+@dataclass
+class AgentRun:
+    """An agent in the scheduler, with its cost accounting and the outcome of its run"""
+
+    agent: Agent
+    api_manager: ApiManager
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[BaseException] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float | None:
+        """The number of seconds that the agent ran, if it has finished"""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class AgentScheduler:
+    """
+    Runs many agents concurrently on one event loop.
+
+    Each agent brings its own config, workspace and memory, and the scheduler gives
+    each one its own ApiManager, so cost accounting and budgets are per agent. The
+    agents share the HTTP connection pools and the rate limiter of the process, and
+    the embedding and completion caches of configs with the same cache directory.
+
+    The agents must run in continuous mode, because they can't ask the user for
+    authorization. An agent that shuts itself down, e.g. with the goals_accomplished
+    command, only ends its own run.
+    """
+
+    max_concurrent_agents: int
+    """Maximum number of agents that run at the same time, 0 for no limit"""
+    runs: list[AgentRun]
+
+    def __init__(self, max_concurrent_agents: int = 0):
+        self.max_concurrent_agents = max_concurrent_agents
+        self.runs = []
+
+    def submit(self, agent: Agent, budget: float = 0.0) -> AgentRun:
+        """
+        Adds an agent to the scheduler, to be run by the next call to `run`.
+
+        Args:
+            agent (Agent): The agent to run.
+            budget (float): The API budget of the agent in dollars, 0 for no budget.
+
+        Returns:
+            AgentRun: The run of the agent, which is updated as it runs.
+        """
+        if not agent.config.continuous_mode:
+            raise ValueError("Agents run by the scheduler must be in continuous mode")
+
+        api_manager = ApiManager.create_scoped()
+        api_manager.set_total_budget(budget)
+        # Keep the cycle logs of agents that are created in the same second apart
+        agent.created_at = f"{agent.created_at}_{len(self.runs)}"
+
+        run = AgentRun(agent, api_manager)
+        self.runs.append(run)
+        return run
+
+    async def run(self) -> list[AgentRun]:
+        """Runs the agents that haven't run yet, and waits until they're all done"""
+        semaphore = (
+            asyncio.Semaphore(self.max_concurrent_agents)
+            if self.max_concurrent_agents > 0
+            else None
+        )
+        await asyncio.gather(
+            *(
+                self._run_agent(run, semaphore)
+                for run in self.runs
+                if run.started_at is None
+            )
+        )
+        return self.runs
+
+    def run_sync(self) -> list[AgentRun]:
+        """Runs the agents from synchronous code, see `run`"""
+        return asyncio.run(self.run())
+
+    def get_total_cost(self) -> float:
+        """The total cost of the API calls of all agents"""
+        return sum(run.api_manager.get_total_cost() for run in self.runs)
+
+    async def _run_agent(
+        self, run: AgentRun, semaphore: asyncio.Semaphore | None
+    ) -> None:
+        async with semaphore or contextlib.nullcontext():
+            # Every agent runs in a task of its own, so the scope only covers its run
+            with run.api_manager.scope():
+                run.started_at = time.monotonic()
+                try:
+                    await run.agent.run_interaction_loop(handle_sigint=False)
+                except SystemExit:
+                    pass
+                except Exception as e:
+                    logger.error(
+                        f"Agent {run.agent.ai_name} failed: {e.__class__.__name__}: {e}"
+                    )
+                    run.error = e
+                finally:
+                    run.finished_at = time.monotonic()
@@ -1,10 +1,13 @@
 """ Command and Control """
+import asyncio
 import json
 from typing import Dict
 
 from autogpt.agent.agent import Agent
 from autogpt.config import Config
 from autogpt.llm import ChatModelResponse
+from autogpt.models.command_registry import COMMAND_SYNONYMS
+from autogpt.utils import submit_to_thread, wait_for_thread
 
 
 def is_valid_int(value: str) -> bool:
@@ -78,19 +81,43 @@ def get_command(
         return "Error:", str(e)
 
 
+def get_commands(
+    assistant_reply_json: Dict, assistant_reply: ChatModelResponse, config: Config
+) -> list[tuple[str, Dict]]:
+    """Parse the response and return the names and arguments of its commands
+
+    A response has either one 'command', or a list of independent 'commands' that
+    are executed at the same time.
+
+    Args:
+        assistant_reply_json (dict): The response object from the AI
+        assistant_reply (ChatModelResponse): The model response from the AI
+        config (Config): The config object
+
+    Returns:
+        list: The name and arguments of each command, see get_command
+    """
+    if (
+        config.openai_functions
+        or not isinstance(assistant_reply_json, dict)
+        or "commands" not in assistant_reply_json
+    ):
+        return [get_command(assistant_reply_json, assistant_reply, config)]
+
+    commands = assistant_reply_json["commands"]
+    if not isinstance(commands, list) or not commands:
+        return [("Error:", "'commands' is not a non-empty list")]
+    return [
+        get_command({"command": command}, assistant_reply, config)
+        for command in commands
+    ]
+
+
 def map_command_synonyms(command_name: str):
     """Takes the original command name given by the AI, and checks if the
     string matches a list of common/known hallucinations
     """
-    synonyms = [
-        ("write_file", "write_to_file"),
-        ("create_file", "write_to_file"),
-        ("search", "google"),
-    ]
-    for seen_command, actual_command_name in synonyms:
-        if command_name == seen_command:
-            return actual_command_name
-    return command_name
+    return COMMAND_SYNONYMS.get(command_name, command_name)
 
 
 def execute_command(
@@ -109,7 +136,7 @@ def execute_command(
         str: The result of the command
     """
     try:
-        cmd = agent.command_registry.commands.get(command_name)
+        cmd = agent.command_registry.get(command_name)
 
         # If the command is found, call it with the provided arguments
         if cmd:
@@ -121,12 +148,9 @@ def execute_command(
         # TODO: Change these to take in a file rather than pasted code, if
         # non-file is given, return instructions "Input should be a python
         # filepath, write your code to file and try again
-        for command in agent.ai_config.prompt_generator.commands:
-            if (
-                command_name == command["label"].lower()
-                or command_name == command["name"].lower()
-            ):
-                return command["function"](**arguments)
+        command = agent.ai_config.prompt_generator.get_command(command_name)
+        if command:
+            return command["function"](**arguments)
         return (
             f"Unknown command '{command_name}'. Please refer to the 'COMMANDS'"
             " list for available commands and only respond in the specified JSON"
@@ -134,3 +158,58 @@ def execute_command(
         )
     except Exception as e:
         return f"Error: {str(e)}"
+
+
+async def execute_commands(
+    commands: list[tuple[str, dict[str, str]]],
+    agent: Agent,
+) -> list[str]:
+    """Execute independent commands at the same time, each in a thread of its own
+
+    If the task that executes the commands is cancelled, it waits for the commands
+    that are running to return.
+
+    The agent waits up to `command_timeout` seconds of its config for each command.
+    Commands can't be interrupted, so this doesn't stop a command that takes longer:
+    it keeps running in the background and may still have effects, e.g. write files,
+    after the agent has moved on. Its result says so, and the eventual return value
+    is discarded.
+
+    Args:
+        commands (list): The name and arguments of each command to execute
+        agent (Agent): The agent that is executing the commands
+
+    Returns:
+        list[str]: The result of each command, in the order of the commands
+    """
+    timeout = agent.config.command_timeout or None
+    exit_request: SystemExit | None = None
+
+    async def execute(command_name: str, arguments: dict[str, str]) -> str:
+        nonlocal exit_request
+        try:
+            return await wait_for_thread(
+                submit_to_thread(
+                    execute_command,
+                    command_name=command_name,
+                    arguments=arguments,
+                    agent=agent,
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            return (
+                f"Error: Command did not finish within {timeout:g} seconds. It may "
+                "still be running in the background, and its result is lost."
+            )
+        except SystemExit as e:
+            # Let the other commands finish before the agent shuts down
+            exit_request = e
+            return "Shutting down"
+
+    results = await asyncio.gather(
+        *(execute(command_name, arguments) for command_name, arguments in commands)
+    )
+    if exit_request is not None:
+        raise exit_request
+    return list(results)
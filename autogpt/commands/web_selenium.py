@@ -30,7 +30,7 @@ from webdriver_manager.microsoft import EdgeChromiumDriverManager as EdgeDriverM
 from autogpt.agent.agent import Agent
 from autogpt.command_decorator import command
 from autogpt.logs import logger
-from autogpt.memory.vector import MemoryItem, get_memory
+from autogpt.memory.vector import MemoryItem
 from autogpt.processing.html import extract_hyperlinks, format_hyperlinks
 from autogpt.url_utils.validators import validate_url
 
@@ -230,8 +230,6 @@ def summarize_memorize_webpage(
     text_length = len(text)
     logger.info(f"Text length: {text_length} characters")
 
-    memory = get_memory(agent.config)
-
     new_memory = MemoryItem.from_webpage(text, url, agent.config, question=question)
-    memory.add(new_memory)
+    agent.memory.add(new_memory)
     return new_memory.summary
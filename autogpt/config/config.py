@@ -32,12 +32,18 @@ class Config:
         self.authorise_key = os.getenv("AUTHORISE_COMMAND_KEY", "y")
         self.exit_key = os.getenv("EXIT_KEY", "n")
         self.plain_output = os.getenv("PLAIN_OUTPUT", "False") == "True"
+        self.console_output_mode = os.getenv("CONSOLE_OUTPUT_MODE", "typing")
+        self.log_cycle_format = os.getenv("LOG_CYCLE_FORMAT", "json")
+        self.log_cycle_history_delta = (
+            os.getenv("LOG_CYCLE_HISTORY_DELTA", "False") == "True"
+        )
 
         disabled_command_categories = os.getenv("DISABLED_COMMAND_CATEGORIES")
         if disabled_command_categories:
             self.disabled_command_categories = disabled_command_categories.split(",")
         else:
             self.disabled_command_categories = []
+        self.command_timeout = float(os.getenv("COMMAND_TIMEOUT", "0"))
 
         self.shell_command_control = os.getenv("SHELL_COMMAND_CONTROL", "denylist")
 
@@ -62,10 +68,17 @@ class Config:
         self.fast_llm_model = os.getenv("FAST_LLM_MODEL", "gpt-3.5-turbo")
         self.smart_llm_model = os.getenv("SMART_LLM_MODEL", "gpt-3.5-turbo")
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "100000"))
+        self.completion_cache_size = int(os.getenv("COMPLETION_CACHE_SIZE", "0"))
+        self.completion_cache_ttl = float(os.getenv("COMPLETION_CACHE_TTL", "86400"))
+        self.cache_directory = os.getenv("CACHE_DIRECTORY")
 
         self.browse_spacy_language_model = os.getenv(
             "BROWSE_SPACY_LANGUAGE_MODEL", "en_core_web_sm"
         )
+        self.summarization_max_concurrency = int(
+            os.getenv("SUMMARIZATION_MAX_CONCURRENCY", "4")
+        )
 
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.openai_organization = os.getenv("OPENAI_ORGANIZATION")
@@ -90,6 +103,11 @@ class Config:
             openai.organization = self.openai_organization
 
         self.openai_functions = os.getenv("OPENAI_FUNCTIONS", "False") == "True"
+        self.openai_streaming = os.getenv("OPENAI_STREAMING", "False") == "True"
+        self.openai_requests_per_minute = int(
+            os.getenv("OPENAI_REQUESTS_PER_MINUTE", "0")
+        )
+        self.openai_tokens_per_minute = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0"))
 
         self.elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
         # ELEVENLABS_VOICE_1_ID is deprecated and included for backwards-compatibility
@@ -149,6 +167,8 @@ class Config:
 
         self.memory_backend = os.getenv("MEMORY_BACKEND", "json_file")
         self.memory_index = os.getenv("MEMORY_INDEX", "auto-gpt-memory")
+        self.memory_ivf_lists = int(os.getenv("MEMORY_IVF_LISTS", "0"))
+        self.memory_ivf_probes = int(os.getenv("MEMORY_IVF_PROBES", "16"))
 
         self.redis_host = os.getenv("REDIS_HOST", "localhost")
         self.redis_port = int(os.getenv("REDIS_PORT", "6379"))
@@ -0,0 +1,119 @@
+"""Incremental parsing of a JSON object from a streamed LLM response."""
+from __future__ import annotations
+
+import ast
+import json
+from typing import Any, Iterator
+
+from autogpt.logs import logger
+
+_OPENING_BRACKETS = "{["
+_CLOSING_BRACKETS = "}]"
+
+
+class IncrementalJSONParser:
+    """Parses the JSON object in a response while the response is being streamed.
+
+    Each top-level member of the object is made available as soon as its value is
+    complete, so e.g. the "thoughts" of a reply can be shown before the model has
+    finished writing the "command". Any text before the opening brace of the object,
+    like a code fence, is skipped, and any text after its closing brace is ignored.
+
+    Attributes:
+        result (dict): The members of the object that have been parsed so far.
+        complete (bool): Whether the closing brace of the object has been received.
+        failed (bool): Whether the value of any member could not be parsed.
+    """
+
+    def __init__(self) -> None:
+        self.result: dict[str, Any] = {}
+        self.complete = False
+        self.failed = False
+
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key: str | None = None
+        self._chars: list[str] = []
+
+    def feed(self, text: str) -> Iterator[tuple[str, Any]]:
+        """Feeds the next piece of the response to the parser.
+
+        Args:
+            text (str): The next piece of the response.
+
+        Yields:
+            tuple[str, Any]: The key and value of each member of the object that is
+                completed by this piece of the response.
+        """
+        for char in text:
+            if self.complete:
+                return
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._chars.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._key is None:
+                # Between members: read the key of the next member
+                if char == ":":
+                    self._key = self._parse_key("".join(self._chars))
+                    self._chars = []
+                elif char == "}":
+                    self.complete = True
+                elif char != ",":
+                    if char == '"':
+                        self._in_string = True
+                    self._chars.append(char)
+                continue
+
+            if self._depth == 1 and char in ",}":
+                member = self._end_member()
+                if member is not None:
+                    yield member
+                if char == "}":
+                    self.complete = True
+                continue
+
+            if char in _OPENING_BRACKETS:
+                self._depth += 1
+            elif char in _CLOSING_BRACKETS:
+                self._depth -= 1
+            elif char == '"':
+                self._in_string = True
+            self._chars.append(char)
+
+    def _parse_key(self, raw_key: str) -> str:
+        raw_key = raw_key.strip()
+        try:
+            return str(json.loads(raw_key))
+        except ValueError:
+            return raw_key.strip("'\"")
+
+    def _end_member(self) -> tuple[str, Any] | None:
+        key, raw_value = self._key, "".join(self._chars).strip()
+        self._key, self._chars = None, []
+        try:
+            value = json.loads(raw_value)
+        except ValueError:
+            try:
+                value = ast.literal_eval(raw_value)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                logger.debug(f"Could not parse streamed value of '{key}': {raw_value}")
+                self.failed = True
+                return None
+        self.result[key] = value
+        return key, value
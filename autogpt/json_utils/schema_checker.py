@@ -0,0 +1,150 @@
+"""Fast validity checks for the JSON schemas of LLM responses."""
+from __future__ import annotations
+
+from typing import Any, Callable, Optional
+
+Checker = Callable[[Any], bool]
+
+# Keywords that don't affect validity
+_ANNOTATIONS = {"$schema", "$id", "title", "description", "default", "examples"}
+
+_TYPE_CONDITIONS = {
+    "object": "isinstance(value, dict)",
+    "array": "isinstance(value, list)",
+    "string": "isinstance(value, str)",
+    "boolean": "isinstance(value, bool)",
+    "null": "value is None",
+    "number": "(isinstance(value, (int, float)) and not isinstance(value, bool))",
+    "integer": "((isinstance(value, int) and not isinstance(value, bool))"
+    " or (isinstance(value, float) and value.is_integer()))",
+}
+
+
+class UnsupportedSchema(Exception):
+    """The schema uses keywords that compile_schema doesn't support"""
+
+
+def compile_schema(schema: dict[str, Any]) -> Optional[Checker]:
+    """
+    Compiles a JSON schema into a Python function that checks whether a value is
+    valid, which is much faster than a jsonschema validator. It supports the subset
+    of JSON Schema that the response formats use; use a jsonschema validator to find
+    out why a value is invalid.
+
+    Args:
+        schema (dict): The JSON schema.
+
+    Returns:
+        Callable[[Any], bool] | None: The check, or None if the schema uses keywords
+            that are not supported.
+    """
+    generator = _CheckerGenerator()
+    try:
+        name = generator.add(schema)
+    except UnsupportedSchema:
+        return None
+    namespace = {"_json_equal": _json_equal, **generator.constants}
+    exec("\n".join(generator.lines), namespace)
+    return namespace[name]
+
+
+def _json_equal(a: Any, b: Any) -> bool:
+    """Whether two values are equal as JSON: booleans are not numbers, unlike in
+    Python, and numbers are compared by value, so 1 equals 1.0"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, str) and isinstance(b, str):
+        return a == b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(_json_equal, a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[k], b[k]) for k in a)
+    return a is None and b is None
+
+
+class _CheckerGenerator:
+    """Generates a function per (sub)schema, which returns False at the first
+    keyword that the value doesn't satisfy"""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.constants: dict[str, Any] = {}
+
+    def constant(self, value: Any) -> str:
+        name = f"_constant_{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def add(self, schema: dict[str, Any]) -> str:
+        if not isinstance(schema, dict):
+            raise UnsupportedSchema(schema)
+
+        # Subschemas are generated first, so the functions that use them come later
+        body: list[str] = []
+        object_checks: list[str] = []
+        array_checks: list[str] = []
+
+        for keyword, value in schema.items():
+            if keyword in _ANNOTATIONS:
+                continue
+            elif keyword == "type":
+                types = value if isinstance(value, list) else [value]
+                if any(type_ not in _TYPE_CONDITIONS for type_ in types):
+                    raise UnsupportedSchema(value)
+                condition = " or ".join(_TYPE_CONDITIONS[type_] for type_ in types)
+                body.append(f"if not ({condition}): return False")
+            elif keyword == "enum":
+                body.append(
+                    f"if not any(_json_equal(value, allowed) for allowed in"
+                    f" {self.constant(value)}): return False"
+                )
+            elif keyword == "required":
+                object_checks += [
+                    f"if {key!r} not in value: return False" for key in value
+                ]
+            elif keyword == "properties":
+                for key, subschema in value.items():
+                    check = self.add(subschema)
+                    object_checks.append(
+                        f"if {key!r} in value and not {check}(value[{key!r}]):"
+                        " return False"
+                    )
+            elif keyword == "additionalProperties":
+                if value is True:
+                    continue
+                if value is not False:
+                    raise UnsupportedSchema(value)
+                allowed = self.constant(frozenset(schema.get("properties", {})))
+                object_checks.append(
+                    f"if not {allowed}.issuperset(value): return False"
+                )
+            elif keyword == "items":
+                check = self.add(value)
+                array_checks.append(
+                    f"if not all({check}(item) for item in value): return False"
+                )
+            elif keyword == "minItems":
+                array_checks.append(f"if len(value) < {int(value)}: return False")
+            elif keyword == "maxItems":
+                array_checks.append(f"if len(value) > {int(value)}: return False")
+            elif keyword in ("anyOf", "oneOf"):
+                checks = ", ".join(self.add(subschema) for subschema in value)
+                matches = f"sum(check(value) for check in ({checks},))"
+                condition = f"{matches} == 1" if keyword == "oneOf" else f"{matches}"
+                body.append(f"if not ({condition}): return False")
+            else:
+                raise UnsupportedSchema(keyword)
+
+        name = f"_check_{len(self.lines)}"
+        self.lines.append(f"def {name}(value):")
+        self.lines += [f"    {line}" for line in body]
+        if object_checks:
+            self.lines.append("    if isinstance(value, dict):")
+            self.lines += [f"        {line}" for line in object_checks]
+        if array_checks:
+            self.lines.append("    if isinstance(value, list):")
+            self.lines += [f"        {line}" for line in array_checks]
+        self.lines.append("    return True")
+        return name
@@ -1,45 +1,151 @@
 """Utilities for the json_fixes package."""
+from __future__ import annotations
+
 import ast
+import copy
+import functools
 import json
 import os.path
-from typing import Any
+import re
+from typing import TYPE_CHECKING, Any, Optional
 
+import orjson
 from jsonschema import Draft7Validator
 
 from autogpt.config import Config
+from autogpt.json_utils.schema_checker import Checker, compile_schema
 from autogpt.logs import logger
 
+if TYPE_CHECKING:
+    from autogpt.llm.base import Message
+
 LLM_DEFAULT_RESPONSE_FORMAT = "llm_response_format_1"
 
+MAX_ORJSON_DEPTH = 1000
+"""
+Maximum nesting depth of the replies that are parsed with orjson. orjson 3.8 parses
+recursively without a depth limit, at about 96 bytes of stack per level: with an
+8 MiB stack it segfaults at about 87,000 nested objects, and threads on macOS only
+get 512 KiB. Deeper replies are parsed by the json module, which raises
+RecursionError instead.
+"""
+
+_json_decoder = json.JSONDecoder()
+_JSON_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+_BRACKET = re.compile(r"[{}\[\]]")
+
 
 def extract_json_from_response(response_content: str) -> dict:
-    # Sometimes the response includes the JSON in a code block with ```
-    if response_content.startswith("```") and response_content.endswith("```"):
-        # Discard the first and last ```, then re-join in case the response naturally included ```
-        response_content = "```".join(response_content.split("```")[1:-1])
+    """
+    Parses the JSON object in a response of the LLM. The object may be wrapped in a
+    code block, or followed by text. Responses that are a Python `str(content_dict)`
+    are parsed as Python literals.
 
-    # response content comes from OpenAI as a Python `str(content_dict)`, literal_eval reverses this
+    Args:
+        response_content (str): The content of the response.
+
+    Returns:
+        dict: The object, or {} if the response doesn't contain one.
+    """
+    content = None
+    if (
+        # The number of brackets is a cheap upper bound of the depth
+        response_content.count("{") + response_content.count("[") <= MAX_ORJSON_DEPTH
+        or _nesting_depth(response_content) <= MAX_ORJSON_DEPTH
+    ):
+        try:
+            content = orjson.loads(response_content)
+        except orjson.JSONDecodeError:
+            pass
+    if content is None:
+        content = _parse_embedded_object(response_content)
+    if isinstance(content, dict):
+        return content
+
+    logger.info("Error parsing JSON response: no JSON object found")
+    logger.debug(f"Invalid JSON received in response: {response_content}")
+    return {}
+
+
+def extract_json_from_message(message: Message) -> dict:
+    """
+    Parses the JSON object in the content of a message, see
+    extract_json_from_response. The object is cached on the message until its content
+    changes, so it must not be modified.
+    """
+    cached = message._parsed_content
+    if cached is not None and cached[0] == message.content:
+        return cached[1]
+
+    content = extract_json_from_response(message.content)
+    message._parsed_content = (message.content, content)
+    return content
+
+
+def _nesting_depth(response_content: str) -> int:
+    """The maximum nesting depth of the brackets in a text, not counting those in
+    JSON strings"""
+    depth = max_depth = 0
+    for bracket in _BRACKET.findall(_JSON_STRING.sub("", response_content)):
+        if bracket in "{[":
+            depth += 1
+            max_depth = max(max_depth, depth)
+        else:
+            depth -= 1
+    return max_depth
+
+
+def _parse_embedded_object(response_content: str) -> Any:
+    # The object starts at the first {, e.g. after ``` or ```json
+    start = response_content.find("{")
+    if start == -1:
+        return None
+
+    # Text after the object, e.g. a closing ```, is ignored
     try:
-        return ast.literal_eval(response_content)
-    except BaseException as e:
-        logger.info(f"Error parsing JSON response with literal_eval {e}")
-        logger.debug(f"Invalid JSON received in response: {response_content}")
-        # TODO: How to raise an error here without causing the program to exit?
-        return {}
+        return _json_decoder.raw_decode(response_content, start)[0]
+    except (json.JSONDecodeError, RecursionError):
+        pass
+
+    # Python literals, e.g. with single quotes, end at the last }
+    end = response_content.rfind("}") + 1
+    try:
+        return ast.literal_eval(response_content[start:end])
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
 
 
 def llm_response_schema(
     config: Config, schema_name: str = LLM_DEFAULT_RESPONSE_FORMAT
 ) -> dict[str, Any]:
+    """
+    Returns the JSON schema of a response format, in the variant for the config.
+    The schema file is loaded once; every call returns a copy of it.
+    """
+    return copy.deepcopy(_load_schema(schema_name, config.openai_functions))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_schema(schema_name: str, openai_functions: bool) -> dict[str, Any]:
+    """Loads a schema, which is shared by the callers, so they must not modify it"""
     filename = os.path.join(os.path.dirname(__file__), f"{schema_name}.json")
     with open(filename, "r") as f:
         json_schema = json.load(f)
-    if config.openai_functions:
+    if openai_functions:
         del json_schema["properties"]["command"]
-        json_schema["required"].remove("command")
+        del json_schema["properties"]["commands"]
+        del json_schema["oneOf"]
     return json_schema
 
 
+@functools.lru_cache(maxsize=None)
+def _get_validator(
+    schema_name: str, openai_functions: bool
+) -> tuple[Draft7Validator, Optional[Checker]]:
+    schema = _load_schema(schema_name, openai_functions)
+    return Draft7Validator(schema), compile_schema(schema)
+
+
 def validate_json(
     json_object: object, config: Config, schema_name: str = LLM_DEFAULT_RESPONSE_FORMAT
 ) -> bool:
@@ -51,8 +157,12 @@ def validate_json(
     Returns:
         bool: Whether the json_object is valid or not
     """
-    schema = llm_response_schema(config, schema_name)
-    validator = Draft7Validator(schema)
+    validator, is_valid = _get_validator(schema_name, config.openai_functions)
+
+    # The compiled check is fast, the validator is only needed to explain errors
+    if is_valid is not None and is_valid(json_object):
+        logger.debug("The JSON object is valid.")
+        return True
 
     if errors := sorted(validator.iter_errors(json_object), key=lambda e: e.path):
         for error in errors:
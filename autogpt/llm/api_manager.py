@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import List, Optional
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
 
 import openai
 from openai import Model
@@ -9,46 +12,150 @@ from autogpt.llm.base import CompletionModelInfo
 from autogpt.logs import logger
 from autogpt.singleton import Singleton
 
+_scoped_api_manager: ContextVar[Optional[ApiManager]] = ContextVar(
+    "scoped_api_manager", default=None
+)
+
+
+class _ScopedSingleton(Singleton):
+    """Returns the instance that is in scope in the current context, if any"""
+
+    def __call__(cls, *args, **kwargs):
+        scoped = _scoped_api_manager.get()
+        if scoped is not None:
+            return scoped
+        return super().__call__(*args, **kwargs)
+
+
+class ApiManager(metaclass=_ScopedSingleton):
+    """
+    Keeps track of the usage and cost of the API calls. By default there is one
+    instance for the whole process; an agent that should have its own accounting
+    puts an instance from `create_scoped` in scope while it runs.
+    """
 
-class ApiManager(metaclass=Singleton):
     def __init__(self):
         self.total_prompt_tokens = 0
         self.total_completion_tokens = 0
         self.total_cost = 0
         self.total_budget = 0
         self.models: Optional[list[Model]] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+        self.saved_cost = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create_scoped(cls) -> ApiManager:
+        """Creates an ApiManager that is separate from the process-wide instance"""
+        api_manager = cls.__new__(cls)
+        api_manager.__init__()
+        return api_manager
+
+    @contextmanager
+    def scope(self) -> Iterator[ApiManager]:
+        """
+        Makes ApiManager() return this instance in the current context, including
+        the tasks and threads that copy the context, e.g. utils.run_in_thread.
+        """
+        token = _scoped_api_manager.set(self)
+        try:
+            yield self
+        finally:
+            _scoped_api_manager.reset(token)
 
     def reset(self):
-        self.total_prompt_tokens = 0
-        self.total_completion_tokens = 0
-        self.total_cost = 0
-        self.total_budget = 0.0
-        self.models = None
+        with self._lock:
+            self.total_prompt_tokens = 0
+            self.total_completion_tokens = 0
+            self.total_cost = 0
+            self.total_budget = 0.0
+            self.models = None
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.saved_prompt_tokens = 0
+            self.saved_completion_tokens = 0
+            self.saved_cost = 0.0
 
     def update_cost(self, prompt_tokens, completion_tokens, model):
         """
         Update the total cost, prompt tokens, and completion tokens.
+        Safe to call from multiple threads at once.
 
         Args:
         prompt_tokens (int): The number of tokens used in the prompt.
         completion_tokens (int): The number of tokens used in the completion.
         model (str): The model used for the API call.
         """
+        cost = self._get_cost(prompt_tokens, completion_tokens, model)
+        self.add_usage(prompt_tokens, completion_tokens, cost)
+
+    def add_usage(self, prompt_tokens, completion_tokens, cost):
+        """
+        Add usage whose cost is already known, e.g. a share of a request that was
+        sent on behalf of several callers. Safe to call from multiple threads at once.
+
+        Args:
+        prompt_tokens (int): The number of tokens used in the prompt.
+        completion_tokens (int): The number of tokens used in the completion.
+        cost (float): The cost of the usage.
+        """
+        with self._lock:
+            self.total_prompt_tokens += prompt_tokens
+            self.total_completion_tokens += completion_tokens
+            self.total_cost += cost
+            total_cost = self.total_cost
+
+        logger.debug(f"Total running cost: ${total_cost:.3f}")
+
+    def update_cache_stats(
+        self, hit: bool, prompt_tokens: int, completion_tokens: int, model: str
+    ):
+        """
+        Count a lookup in the completion cache, and the usage that a hit has saved.
+
+        Args:
+        hit (bool): Whether the completion was served from the cache.
+        prompt_tokens (int): The number of tokens in the prompt of the completion.
+        completion_tokens (int): The number of tokens in the completion.
+        model (str): The model of the completion.
+        """
+        if not hit:
+            with self._lock:
+                self.cache_misses += 1
+            return
+
+        cost = self._get_cost(prompt_tokens, completion_tokens, model)
+        with self._lock:
+            self.cache_hits += 1
+            self.saved_prompt_tokens += prompt_tokens
+            self.saved_completion_tokens += completion_tokens
+            self.saved_cost += cost
+
+    def get_cache_hit_rate(self):
+        """
+        Get the share of completion cache lookups that were hits.
+
+        Returns:
+        float: The hit rate of the completion cache, 0 if it hasn't been used.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def _get_cost(prompt_tokens, completion_tokens, model):
         # the .model property in API responses can contain version suffixes like -v2
         from autogpt.llm.providers.openai import OPEN_AI_MODELS
 
         model = model[:-3] if model.endswith("-v2") else model
         model_info = OPEN_AI_MODELS[model]
 
-        self.total_prompt_tokens += prompt_tokens
-        self.total_completion_tokens += completion_tokens
-        self.total_cost += prompt_tokens * model_info.prompt_token_cost / 1000
+        cost = prompt_tokens * model_info.prompt_token_cost / 1000
         if issubclass(type(model_info), CompletionModelInfo):
-            self.total_cost += (
-                completion_tokens * model_info.completion_token_cost / 1000
-            )
-
-        logger.debug(f"Total running cost: ${self.total_cost:.3f}")
+            cost += completion_tokens * model_info.completion_token_cost / 1000
+        return cost
 
     def set_total_budget(self, total_budget):
         """
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import itertools
 from dataclasses import dataclass, field
 from math import ceil, floor
 from typing import TYPE_CHECKING, List, Literal, Optional, TypedDict
@@ -14,6 +15,9 @@ TText = list[int]
 """Token array representing tokenized text"""
 
 
+_message_sequence_ids = itertools.count()
+
+
 class MessageDict(TypedDict):
     role: MessageRole
     content: str
@@ -27,6 +31,22 @@ class Message:
     content: str
     type: MessageType | None = None
 
+    sequence_id: int = field(
+        default_factory=lambda: next(_message_sequence_ids),
+        init=False,
+        repr=False,
+        compare=False,
+    )
+    """Monotonically increasing ID that identifies the message within the process"""
+    _token_counts: dict[str, tuple[str, str, int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    """Token count of the role and content per encoding, see count_tokens_per_message"""
+    _parsed_content: tuple[str, dict] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    """Content and the JSON object parsed from it, see extract_json_from_message"""
+
     def raw(self) -> MessageDict:
         return {"role": self.role, "content": self.content}
 
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import functools
 import time
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 
-from autogpt.llm.providers.openai import get_openai_command_specs
+from autogpt.llm.providers.openai import get_openai_functions
 
 if TYPE_CHECKING:
     from autogpt.agent.agent import Agent
@@ -16,6 +17,15 @@ from autogpt.log_cycle.log_cycle import CURRENT_CONTEXT_FILE_NAME
 from autogpt.logs import logger
 
 
+@functools.lru_cache(maxsize=16)
+def system_prompt_message(system_prompt: str) -> Message:
+    """
+    Returns the message of a system prompt. The same message is returned every cycle,
+    so the token count that is cached on it is only computed once.
+    """
+    return Message("system", system_prompt)
+
+
 # TODO: Change debug from hardcode to argument
 def chat_with_ai(
     config: Config,
@@ -24,6 +34,7 @@ def chat_with_ai(
     triggering_prompt: str,
     token_limit: int,
     model: str | None = None,
+    on_delta: Callable[[str], bool] | None = None,
 ):
     """
     Interact with the OpenAI API, sending the prompt, user input,
@@ -36,6 +47,8 @@ def chat_with_ai(
         triggering_prompt (str): The input from the user.
         token_limit (int): The maximum number of tokens allowed in the API call.
         model (str, optional): The model to use. If None, the config.fast_llm_model will be used. Defaults to None.
+        on_delta (Callable[[str], bool], optional): Streams the response to this
+            callback, see create_chat_completion. Defaults to None.
 
     Returns:
     str: The AI's response.
@@ -64,7 +77,7 @@ def chat_with_ai(
     message_sequence = ChatSequence.for_model(
         model,
         [
-            Message("system", system_prompt),
+            system_prompt_message(system_prompt),
             Message("system", f"The current time and date is {time.strftime('%c')}"),
             # Message(
             #     "system",
@@ -96,19 +109,19 @@ def chat_with_ai(
     current_tokens_used += count_message_tokens([user_input_msg], model)
 
     current_tokens_used += 500  # Reserve space for new_summary_message
-    current_tokens_used += 500  # Reserve space for the openai functions TODO improve
 
-    # Add Messages until the token limit is reached or there are no more messages to add.
-    for cycle in reversed(list(agent.history.per_cycle(agent.config))):
-        messages_to_add = [msg for msg in cycle if msg is not None]
-        tokens_to_add = count_message_tokens(messages_to_add, model)
-        if current_tokens_used + tokens_to_add > send_token_limit:
-            break
+    # Account for the OpenAI functions
+    functions = get_openai_functions(agent)
+    if functions:
+        current_tokens_used += functions.count_tokens(model)
 
-        # Add the most recent message to the start of the chain,
-        #  after the system prompts.
-        message_sequence.insert(insertion_index, *messages_to_add)
-        current_tokens_used += tokens_to_add
+    # Add the most recent cycles until the token limit is reached or there are no
+    # more messages to add, after the system prompts.
+    messages_to_add, tokens_to_add = agent.history.context_window(
+        model, send_token_limit - current_tokens_used
+    )
+    message_sequence.insert(insertion_index, *messages_to_add)
+    current_tokens_used += tokens_to_add
 
     # Update & add summary of trimmed messages
     if len(agent.history) > 0:
@@ -196,8 +209,9 @@ def chat_with_ai(
     assistant_reply = create_chat_completion(
         prompt=message_sequence,
         config=agent.config,
-        functions=get_openai_command_specs(agent),
+        functions=functions,
         max_tokens=tokens_remaining,
+        on_delta=on_delta,
     )
 
     # Update full message history
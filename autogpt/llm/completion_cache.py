@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from openai.openai_object import OpenAIObject
+
+from autogpt.config import Config
+from autogpt.llm.base import MessageDict
+from autogpt.llm.providers.openai import OpenAIFunctionCall
+from autogpt.logs import logger
+
+
+@dataclass
+class CachedCompletion:
+    """The parts of a chat completion response that are kept in the cache"""
+
+    content: Optional[str]
+    function_call: Optional[OpenAIFunctionCall]
+    prompt_tokens: int
+    completion_tokens: int
+
+    @classmethod
+    def from_response(cls, response: OpenAIObject) -> CachedCompletion:
+        message = response.choices[0].message
+        function_call = message.get("function_call")
+        usage = response.get("usage") or {}
+        return cls(
+            content=message.get("content"),
+            function_call=OpenAIFunctionCall(
+                name=function_call.name, arguments=function_call.arguments
+            )
+            if function_call
+            else None,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+
+
+class CompletionCache:
+    """
+    Disk-backed cache of chat completions, stored in an SQLite database.
+
+    Entries are keyed by a hash of everything that determines the response of a
+    deterministic request, and expire `ttl` seconds after they were stored. When the
+    cache holds more than `max_entries` completions, the least recently used ones are
+    evicted. Identical requests that are made at the same time share one call to the
+    API.
+    """
+
+    path: Path
+    max_entries: int
+    ttl: float
+    """Lifetime of the entries in seconds, 0 for no expiry"""
+
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+    _in_flight: dict[bytes, Future]
+    """Requests that are being sent to the API, by key"""
+    _clock: int
+    """Last-used stamp of the most recently used entry"""
+
+    def __init__(self, path: Path, max_entries: int, ttl: float) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key BLOB PRIMARY KEY, completion TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used INTEGER NOT NULL"
+                ")"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS completions_last_used "
+                "ON completions (last_used)"
+            )
+        (self._clock,) = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0) FROM completions"
+        ).fetchone()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM completions"
+            ).fetchone()[0]
+
+    @staticmethod
+    def key(
+        model: str,
+        messages: list[MessageDict],
+        functions: Optional[list[dict]],
+        temperature: float,
+        max_tokens: Optional[int],
+    ) -> bytes:
+        """The cache key of a chat completion request"""
+        request = json.dumps(
+            [model, messages, functions or None, temperature, max_tokens],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(request.encode("utf-8")).digest()
+
+    def get(self, key: bytes) -> CachedCompletion | None:
+        """Looks up a completion, or returns None if it's not in the cache"""
+        with self._lock:
+            return self._get(key)
+
+    def get_or_create(
+        self, key: bytes, create: Callable[[], CachedCompletion]
+    ) -> tuple[CachedCompletion, bool]:
+        """
+        Looks up a completion, or creates and stores it if it's not in the cache. If
+        the same completion is already being created, waits for that instead.
+
+        Returns:
+            tuple: The completion, and whether it was served without calling `create`.
+        """
+        with self._lock:
+            completion = self._get(key)
+            if completion is not None:
+                return completion, True
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                self._in_flight[key] = future = Future()
+
+        if in_flight is not None:
+            return in_flight.result(), True
+
+        try:
+            completion = create()
+            self.put(key, completion)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(completion)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return completion, False
+
+    def put(self, key: bytes, completion: CachedCompletion) -> None:
+        """Stores a completion, evicting expired and old entries if needed"""
+        if self.max_entries < 1:
+            return
+
+        value = json.dumps(asdict(completion))
+
+        with self._lock:
+            self._clock += 1
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO completions "
+                    "(key, completion, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, time.time(), self._clock),
+                )
+                if self.ttl:
+                    self._connection.execute(
+                        "DELETE FROM completions WHERE created_at < ?",
+                        (time.time() - self.ttl,),
+                    )
+
+                (size,) = self._connection.execute(
+                    "SELECT COUNT(*) FROM completions"
+                ).fetchone()
+                if size > self.max_entries:
+                    logger.debug(
+                        f"Evicting {size - self.max_entries} entries "
+                        f"from completion cache '{self.path}'"
+                    )
+                    self._connection.execute(
+                        "DELETE FROM completions WHERE key IN ("
+                        "SELECT key FROM completions ORDER BY last_used LIMIT ?"
+                        ")",
+                        (size - self.max_entries,),
+                    )
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM completions")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _get(self, key: bytes) -> CachedCompletion | None:
+        row = self._connection.execute(
+            "SELECT completion, created_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, created_at = row
+        if self.ttl and created_at < time.time() - self.ttl:
+            return None
+
+        self._clock += 1
+        with self._connection:
+            self._connection.execute(
+                "UPDATE completions SET last_used = ? WHERE key = ?",
+                (self._clock, key),
+            )
+
+        entry = json.loads(value)
+        function_call = entry["function_call"]
+        return CachedCompletion(
+            content=entry["content"],
+            function_call=OpenAIFunctionCall(**function_call)
+            if function_call
+            else None,
+            prompt_tokens=entry["prompt_tokens"],
+            completion_tokens=entry["completion_tokens"],
+        )
+
+
+_caches: dict[Path, CompletionCache] = {}
+
+
+def get_completion_cache(config: Config) -> CompletionCache | None:
+    """Gets the completion cache of the config, or None if caching is disabled"""
+    cache_directory = config.cache_directory or config.workspace_path
+    if config.completion_cache_size < 1 or not cache_directory:
+        return None
+
+    path = Path(cache_directory) / "completion_cache.sqlite3"
+    if path not in _caches:
+        _caches[path] = CompletionCache(
+            path, config.completion_cache_size, config.completion_cache_ttl
+        )
+    cache = _caches[path]
+    cache.max_entries = config.completion_cache_size
+    cache.ttl = config.completion_cache_ttl
+    return cache
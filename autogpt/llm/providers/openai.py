@@ -1,27 +1,36 @@
 from __future__ import annotations
 
+import asyncio
 import functools
+import inspect
+import random
+import threading
 import time
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, List, Optional
-from unittest.mock import patch
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+from weakref import WeakKeyDictionary
 
+import aiohttp
 import openai
-import openai.api_resources.abstract.engine_api_resource as engine_api_resource
+import requests
 from colorama import Fore, Style
+from openai import api_requestor
 from openai.error import APIError, RateLimitError, Timeout
 from openai.openai_object import OpenAIObject
 
 if TYPE_CHECKING:
     from autogpt.agent.agent import Agent
+    from autogpt.models.command import Command
 
 from autogpt.llm.base import (
     ChatModelInfo,
     EmbeddingModelInfo,
+    Message,
     MessageDict,
     TextModelInfo,
     TText,
 )
+from autogpt.llm.rate_limiter import RateLimiter
 from autogpt.logs import logger
 
 OPEN_AI_CHAT_MODELS = {
@@ -114,39 +123,96 @@ OPEN_AI_MODELS: dict[str, ChatModelInfo | EmbeddingModelInfo | TextModelInfo] =
 }
 
 
-def meter_api(func):
-    """Adds ApiManager metering to functions which make OpenAI API calls"""
-    from autogpt.llm.api_manager import ApiManager
+AIOHTTP_CONNECTION_LIMIT = 100
+"""Maximum number of open connections of the shared HTTP client of the async calls"""
+
+_aiohttp_sessions: WeakKeyDictionary[
+    asyncio.AbstractEventLoop, aiohttp.ClientSession
+] = WeakKeyDictionary()
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """Get the HTTP client shared by the async API calls on the running event loop.
+
+    The client keeps its connections alive, so consecutive and concurrent calls
+    don't have to set up a new connection for every request like they would with
+    the default client of the openai library.
+    """
+    loop = asyncio.get_running_loop()
+    session = _aiohttp_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=AIOHTTP_CONNECTION_LIMIT)
+        )
+        _aiohttp_sessions[loop] = session
+    return session
+
 
-    api_manager = ApiManager()
+async def close_aiohttp_session() -> None:
+    """Close the shared HTTP client of the running event loop, if there is one"""
+    session = _aiohttp_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
 
-    openai_obj_processor = openai.util.convert_to_openai_object
 
-    def update_usage_with_response(response: OpenAIObject):
-        try:
-            usage = response.usage
-            logger.debug(f"Reported usage from call to model {response.model}: {usage}")
-            api_manager.update_cost(
-                response.usage.prompt_tokens,
-                response.usage.completion_tokens if "completion_tokens" in usage else 0,
-                response.model,
+REQUESTS_POOL_SIZE = 100
+"""Maximum number of connections per host that the sync API calls keep alive"""
+
+_requests_session: requests.Session | None = None
+_requests_session_lock = threading.Lock()
+
+
+def use_shared_requests_session() -> None:
+    """Make the sync API calls of the current thread use the HTTP client that all
+    threads share.
+
+    The openai library gives every thread a client of its own, so calls from
+    short-lived threads, like the ones that the agent loop runs its steps in, would
+    otherwise set up a new connection for every request.
+    """
+    global _requests_session
+    with _requests_session_lock:
+        if _requests_session is None:
+            _requests_session = api_requestor._make_session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=REQUESTS_POOL_SIZE,
+                max_retries=api_requestor.MAX_CONNECTION_RETRIES,
             )
-        except Exception as err:
-            logger.warn(f"Failed to update API costs: {err.__class__.__name__}: {err}")
+            _requests_session.mount("https://", adapter)
+            _requests_session.mount("http://", adapter)
+    # The openai library looks up the client of a thread in this thread-local
+    api_requestor._thread_context.session = _requests_session
+
+
+def update_usage_with_response(response: OpenAIObject) -> None:
+    """Update the ApiManager with the usage reported in an API response"""
+    from autogpt.llm.api_manager import ApiManager
+
+    try:
+        usage = response.usage
+        logger.debug(f"Reported usage from call to model {response.model}: {usage}")
+        ApiManager().update_cost(
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens if "completion_tokens" in usage else 0,
+            response.model,
+        )
+    except Exception as err:
+        logger.warn(f"Failed to update API costs: {err.__class__.__name__}: {err}")
 
-    def metering_wrapper(*args, **kwargs):
-        openai_obj = openai_obj_processor(*args, **kwargs)
-        if isinstance(openai_obj, OpenAIObject) and "usage" in openai_obj:
-            update_usage_with_response(openai_obj)
-        return openai_obj
 
+def meter_api(func):
+    """Adds ApiManager metering to functions which make OpenAI API calls
+
+    The usage is read from the response that the function returns, so metered
+    functions can be called from multiple threads at once.
+    """
+
+    @functools.wraps(func)
     def metered_func(*args, **kwargs):
-        with patch.object(
-            engine_api_resource.util,
-            "convert_to_openai_object",
-            side_effect=metering_wrapper,
-        ):
-            return func(*args, **kwargs)
+        response = func(*args, **kwargs)
+        if isinstance(response, OpenAIObject) and "usage" in response:
+            update_usage_with_response(response)
+        return response
 
     return metered_func
 
@@ -173,37 +239,107 @@ def retry_api(
         f"{Fore.RED}Error: API Bad gateway. Waiting {{backoff}} seconds...{Fore.RESET}"
     )
 
+    num_attempts = num_retries + 1  # +1 for the first attempt
+
+    def _backoff_after(
+        error: Exception, attempt: int, user_warned: bool
+    ) -> tuple[float, bool]:
+        """Raises the error if it can't be retried, else returns the time to wait
+        before the next attempt and whether the user has been warned"""
+        if isinstance(error, RateLimitError):
+            if attempt == num_attempts:
+                raise error
+
+            logger.debug(retry_limit_msg)
+            if not user_warned:
+                logger.double_check(api_key_error_msg)
+                user_warned = True
+
+        elif (error.http_status not in [429, 502, 503]) or (attempt == num_attempts):
+            raise error
+
+        backoff = _retry_after(error)
+        if backoff is None:
+            # Jitter keeps concurrent calls from retrying all at the same time
+            backoff = random.uniform(0.5, 1) * backoff_base ** (attempt + 2)
+        logger.debug(backoff_msg.format(backoff=round(backoff, 2)))
+        return backoff, user_warned
+
     def _wrapper(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def _async_wrapped(*args, **kwargs):
+                user_warned = not warn_user
+                for attempt in range(1, num_attempts + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except (RateLimitError, APIError, Timeout) as e:
+                        backoff, user_warned = _backoff_after(e, attempt, user_warned)
+                    RateLimiter().record_backoff(_requested_model(kwargs), backoff)
+                    await asyncio.sleep(backoff)
+
+            return _async_wrapped
+
         @functools.wraps(func)
         def _wrapped(*args, **kwargs):
             user_warned = not warn_user
-            num_attempts = num_retries + 1  # +1 for the first attempt
             for attempt in range(1, num_attempts + 1):
                 try:
                     return func(*args, **kwargs)
+                except (RateLimitError, APIError, Timeout) as e:
+                    backoff, user_warned = _backoff_after(e, attempt, user_warned)
+                RateLimiter().record_backoff(_requested_model(kwargs), backoff)
+                time.sleep(backoff)
 
-                except RateLimitError:
-                    if attempt == num_attempts:
-                        raise
+        return _wrapped
 
-                    logger.debug(retry_limit_msg)
-                    if not user_warned:
-                        logger.double_check(api_key_error_msg)
-                        user_warned = True
+    return _wrapper
 
-                except (APIError, Timeout) as e:
-                    if (e.http_status not in [429, 502, 503]) or (
-                        attempt == num_attempts
-                    ):
-                        raise
 
-                backoff = backoff_base ** (attempt + 2)
-                logger.debug(backoff_msg.format(backoff=backoff))
-                time.sleep(backoff)
+def _retry_after(error: Exception) -> float | None:
+    """Returns the number of seconds in the Retry-After header of an error response"""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
 
-        return _wrapped
 
-    return _wrapper
+def _requested_model(kwargs: dict) -> str:
+    return kwargs.get("model") or kwargs.get("deployment_id") or ""
+
+
+def _count_chat_tokens(messages: List[MessageDict], kwargs: dict) -> int:
+    """Estimates the tokens that a chat completion request counts towards the limit"""
+    from autogpt.llm.utils.token_counter import (
+        count_message_tokens,
+        count_string_tokens,
+    )
+
+    model = _requested_model(kwargs)
+    try:
+        prompt_tokens = count_message_tokens(
+            [Message(m["role"], m.get("content") or "") for m in messages], model
+        )
+    except NotImplementedError:
+        prompt_tokens = sum(
+            count_string_tokens(m.get("content") or "", model) for m in messages
+        )
+    return prompt_tokens + (kwargs.get("max_tokens") or 0)
+
+
+def _count_input_tokens(
+    input: str | TText | List[str] | List[TText], model: str
+) -> int:
+    """Estimates the tokens that a text or embedding input counts towards the limit"""
+    from autogpt.llm.utils.token_counter import count_string_tokens
+
+    if isinstance(input, str):
+        return count_string_tokens(input, model)
+    if input and isinstance(input[0], int):
+        return len(input)
+    return sum(_count_input_tokens(i, model) for i in input)
 
 
 @meter_api
@@ -222,6 +358,10 @@ def create_chat_completion(
         OpenAIObject: The ChatCompletion response from OpenAI
 
     """
+    use_shared_requests_session()
+    RateLimiter().acquire(
+        _requested_model(kwargs), lambda: _count_chat_tokens(messages, kwargs)
+    )
     completion: OpenAIObject = openai.ChatCompletion.create(
         messages=messages,
         **kwargs,
@@ -231,6 +371,39 @@ def create_chat_completion(
     return completion
 
 
+@retry_api()
+def _open_chat_completion_stream(
+    messages: List[MessageDict], **kwargs
+) -> Iterator[OpenAIObject]:
+    use_shared_requests_session()
+    RateLimiter().acquire(
+        _requested_model(kwargs), lambda: _count_chat_tokens(messages, kwargs)
+    )
+    return openai.ChatCompletion.create(messages=messages, stream=True, **kwargs)
+
+
+def stream_chat_completion(
+    messages: List[MessageDict],
+    *_,
+    **kwargs,
+) -> Iterator[OpenAIObject]:
+    """Create a chat completion using the OpenAI API, streaming the response
+
+    Streamed responses don't report their token usage, so the caller is responsible
+    for metering them.
+
+    Args:
+        messages: A list of messages to feed to the chatbot.
+        kwargs: Other arguments to pass to the OpenAI API chat completion call.
+    Yields:
+        OpenAIObject: The deltas of the generated message, as they are received
+
+    """
+    for chunk in _open_chat_completion_stream(messages, **kwargs):
+        if chunk.choices:
+            yield chunk.choices[0].delta
+
+
 @meter_api
 @retry_api()
 def create_text_completion(
@@ -247,6 +420,12 @@ def create_text_completion(
         OpenAIObject: The Completion response from OpenAI
 
     """
+    use_shared_requests_session()
+    model = _requested_model(kwargs)
+    RateLimiter().acquire(
+        model,
+        lambda: _count_input_tokens(prompt, model) + (kwargs.get("max_tokens") or 16),
+    )
     return openai.Completion.create(
         prompt=prompt,
         **kwargs,
@@ -269,12 +448,76 @@ def create_embedding(
         OpenAIObject: The Embedding response from OpenAI
 
     """
+    use_shared_requests_session()
+    model = _requested_model(kwargs)
+    RateLimiter().acquire(model, lambda: _count_input_tokens(input, model))
     return openai.Embedding.create(
         input=input,
         **kwargs,
     )
 
 
+@retry_api()
+async def acreate_chat_completion(
+    messages: List[MessageDict],
+    *_,
+    **kwargs,
+) -> OpenAIObject:
+    """Create a chat completion using the OpenAI API, without blocking the event loop
+
+    Args:
+        messages: A list of messages to feed to the chatbot.
+        kwargs: Other arguments to pass to the OpenAI API chat completion call.
+    Returns:
+        OpenAIObject: The ChatCompletion response from OpenAI
+
+    """
+    await RateLimiter().aacquire(
+        _requested_model(kwargs), lambda: _count_chat_tokens(messages, kwargs)
+    )
+    session_token = openai.aiosession.set(get_aiohttp_session())
+    try:
+        completion: OpenAIObject = await openai.ChatCompletion.acreate(
+            messages=messages,
+            **kwargs,
+        )
+    finally:
+        openai.aiosession.reset(session_token)
+    if not hasattr(completion, "error"):
+        logger.debug(f"Response: {completion}")
+        update_usage_with_response(completion)
+    return completion
+
+
+@retry_api()
+async def acreate_embedding(
+    input: str | TText | List[str] | List[TText],
+    *_,
+    **kwargs,
+) -> OpenAIObject:
+    """Create an embedding using the OpenAI API, without blocking the event loop
+
+    Args:
+        input: The text to embed.
+        kwargs: Other arguments to pass to the OpenAI API embedding call.
+    Returns:
+        OpenAIObject: The Embedding response from OpenAI
+
+    """
+    model = _requested_model(kwargs)
+    await RateLimiter().aacquire(model, lambda: _count_input_tokens(input, model))
+    session_token = openai.aiosession.set(get_aiohttp_session())
+    try:
+        embedding: OpenAIObject = await openai.Embedding.acreate(
+            input=input,
+            **kwargs,
+        )
+    finally:
+        openai.aiosession.reset(session_token)
+    update_usage_with_response(embedding)
+    return embedding
+
+
 @dataclass
 class OpenAIFunctionCall:
     """Represents a function call as generated by an OpenAI model
@@ -325,26 +568,122 @@ class OpenAIFunctionSpec:
         }
 
 
+@dataclass
+class OpenAIFunctions:
+    """
+    The specs of a set of commands as OpenAI functions, with the `functions` payload
+    of a chat completion request, which are built once and then reused.
+    """
+
+    specs: list[OpenAIFunctionSpec]
+    payload: list[dict] = field(init=False)
+    """The OpenAI-consumable function specifications"""
+    _token_counts: dict[str, int] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.payload = [spec.__dict__ for spec in self.specs]
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    @classmethod
+    def from_commands(cls, commands: Iterable[Command]) -> OpenAIFunctions:
+        return cls(
+            [
+                OpenAIFunctionSpec(
+                    name=command.name,
+                    description=command.description,
+                    parameters={
+                        param.name: OpenAIFunctionSpec.ParameterSpec(
+                            name=param.name,
+                            type=param.type,
+                            required=param.required,
+                            description=param.description,
+                        )
+                        for param in command.parameters
+                    },
+                )
+                for command in commands
+            ]
+        )
+
+    def count_tokens(self, model: str) -> int:
+        """The number of prompt tokens that the functions take up for a model"""
+        if model not in self._token_counts:
+            self._token_counts[model] = count_openai_functions_tokens(self.specs, model)
+        return self._token_counts[model]
+
+
+def format_openai_function_for_prompt(func: OpenAIFunctionSpec) -> str:
+    """Returns the function formatted similarly to the way OpenAI does it internally:
+    https://community.openai.com/t/how-to-calculate-the-tokens-when-using-function-call/266573/18
+
+    Example:
+    ```ts
+    // Get the current weather in a given location
+    type get_current_weather = (_: {
+    // The city and state, e.g. San Francisco, CA
+    location: string,
+    unit?: "celsius" | "fahrenheit",
+    }) => any;
+    ```
+    """
+
+    def param_signature(p_spec: OpenAIFunctionSpec.ParameterSpec) -> str:
+        return (
+            f"// {p_spec.description}\n" if p_spec.description else ""
+        ) + f"{p_spec.name}{'' if p_spec.required else '?'}: {p_spec.type},"
+
+    return "\n".join(
+        [
+            f"// {func.description}",
+            f"type {func.name} = (_: {{",
+            *[param_signature(p) for p in func.parameters.values()],
+            "}) => any;",
+        ]
+    )
+
+
+def format_function_specs_as_typescript_ns(functions: list[OpenAIFunctionSpec]) -> str:
+    """Returns a function signature block in the format used by OpenAI internally:
+    https://community.openai.com/t/how-to-calculate-the-tokens-when-using-function-call/266573/18
+    """
+    return (
+        "namespace functions {\n\n"
+        + "\n\n".join(format_openai_function_for_prompt(f) for f in functions)
+        + "\n\n} // namespace functions"
+    )
+
+
+def count_openai_functions_tokens(
+    functions: list[OpenAIFunctionSpec], for_model: str
+) -> int:
+    """Returns the number of tokens taken up by a set of function definitions
+
+    Reference: https://community.openai.com/t/how-to-calculate-the-tokens-when-using-function-call/266573/18
+    """
+    from autogpt.llm.utils import count_string_tokens
+
+    return count_string_tokens(
+        f"# Tools\n\n## functions\n\n{format_function_specs_as_typescript_ns(functions)}",
+        for_model,
+    )
+
+
+def get_openai_functions(agent: Agent) -> OpenAIFunctions | None:
+    """Get the OpenAI functions of the agent's available commands, if it uses them.
+    see https://platform.openai.com/docs/guides/gpt/function-calling
+    """
+    if not agent.config.openai_functions:
+        return None
+    return agent.command_registry.openai_functions()
+
+
 def get_openai_command_specs(agent: Agent) -> list[OpenAIFunctionSpec]:
     """Get OpenAI-consumable function specs for the agent's available commands.
     see https://platform.openai.com/docs/guides/gpt/function-calling
     """
-    if not agent.config.openai_functions:
-        return []
-
-    return [
-        OpenAIFunctionSpec(
-            name=command.name,
-            description=command.description,
-            parameters={
-                param.name: OpenAIFunctionSpec.ParameterSpec(
-                    name=param.name,
-                    type=param.type,
-                    required=param.required,
-                    description=param.description,
-                )
-                for param in command.parameters
-            },
-        )
-        for command in agent.command_registry.commands.values()
-    ]
+    functions = get_openai_functions(agent)
+    return functions.specs if functions else []
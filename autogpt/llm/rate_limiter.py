@@ -0,0 +1,170 @@
+"""Proactive rate limiting of the requests that are sent to the LLM provider"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from autogpt.logs import logger
+from autogpt.singleton import Singleton
+
+
+class TokenBucket:
+    """A budget of `capacity` units per minute, which is refilled continuously"""
+
+    def __init__(self, capacity: float, clock: Optional[Callable[[], float]] = None):
+        self.capacity = capacity
+        self.level = capacity
+        self.refill_rate = capacity / 60
+        self._clock = clock or time.monotonic
+        self._updated_at = self._clock()
+
+    def time_until_available(self, amount: float) -> float:
+        """
+        Returns the number of seconds until the bucket holds `amount` units.
+        Amounts larger than the capacity of the bucket are capped at its capacity.
+        """
+        now = self._clock()
+        self.level = min(
+            self.capacity, self.level + (now - self._updated_at) * self.refill_rate
+        )
+        self._updated_at = now
+
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0) / self.refill_rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+@dataclass
+class RateLimitStats:
+    """The time that the calls to a model have spent waiting"""
+
+    waits: int = 0
+    wait_time: float = 0.0
+    """Time spent waiting for the rate limiter before sending requests"""
+    retries: int = 0
+    backoff_time: float = 0.0
+    """Time spent backing off after requests were rejected"""
+
+
+class RateLimiter(metaclass=Singleton):
+    """
+    Limits the requests and tokens per minute that are sent to each model, so calls
+    wait for capacity before they are sent instead of being rejected by the API.
+    """
+
+    def __init__(self):
+        self.requests_per_minute = 0
+        self.tokens_per_minute = 0
+        self.stats: dict[str, RateLimitStats] = {}
+        self._buckets: dict[str, tuple[TokenBucket | None, TokenBucket | None]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        """
+        Sets the budgets of each model. A budget of 0 means no limit.
+
+        Args:
+            requests_per_minute (int): The number of requests per minute per model.
+            tokens_per_minute (int): The number of tokens per minute per model.
+        """
+        with self._lock:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self._buckets.clear()
+
+    def reset(self) -> None:
+        self.configure(0, 0)
+        self.stats.clear()
+
+    def get_stats(self, model: str) -> RateLimitStats:
+        with self._lock:
+            return self.stats.setdefault(model, RateLimitStats())
+
+    def reserve(self, model: str, tokens: int) -> float:
+        """
+        Takes one request and `tokens` tokens from the budget of a model if they are
+        available, else returns the number of seconds to wait before trying again.
+        """
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = (
+                    TokenBucket(self.requests_per_minute)
+                    if self.requests_per_minute
+                    else None,
+                    TokenBucket(self.tokens_per_minute)
+                    if self.tokens_per_minute
+                    else None,
+                )
+            requests_bucket, tokens_bucket = self._buckets[model]
+
+            delay = max(
+                requests_bucket.time_until_available(1) if requests_bucket else 0,
+                tokens_bucket.time_until_available(tokens) if tokens_bucket else 0,
+            )
+            if delay == 0:
+                if requests_bucket:
+                    requests_bucket.take(1)
+                if tokens_bucket:
+                    tokens_bucket.take(tokens)
+            return delay
+
+    def acquire(
+        self, model: str, estimate_tokens: Optional[Callable[[], int]] = None
+    ) -> float:
+        """
+        Blocks until the budget of a model allows sending a request.
+
+        Args:
+            model (str): The model that the request is sent to.
+            estimate_tokens (Callable[[], int], optional): Estimates the number of
+                tokens of the request. Only called if tokens are limited.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        if not (self.requests_per_minute or self.tokens_per_minute):
+            return 0.0
+
+        tokens = estimate_tokens() if estimate_tokens and self.tokens_per_minute else 0
+        waited = 0.0
+        while delay := self.reserve(model, tokens):
+            time.sleep(delay)
+            waited += delay
+        self._record_wait(model, waited)
+        return waited
+
+    async def aacquire(
+        self, model: str, estimate_tokens: Optional[Callable[[], int]] = None
+    ) -> float:
+        """Like acquire, but waits without blocking the event loop"""
+        if not (self.requests_per_minute or self.tokens_per_minute):
+            return 0.0
+
+        tokens = estimate_tokens() if estimate_tokens and self.tokens_per_minute else 0
+        waited = 0.0
+        while delay := self.reserve(model, tokens):
+            await asyncio.sleep(delay)
+            waited += delay
+        self._record_wait(model, waited)
+        return waited
+
+    def record_backoff(self, model: str, backoff: float) -> None:
+        """Records the time that a call to a model backs off before a retry"""
+        with self._lock:
+            stats = self.stats.setdefault(model, RateLimitStats())
+            stats.retries += 1
+            stats.backoff_time += backoff
+
+    def _record_wait(self, model: str, waited: float) -> None:
+        if not waited:
+            return
+        logger.debug(f"Waited {waited:.2f}s for the rate limit of model {model}")
+        with self._lock:
+            stats = self.stats.setdefault(model, RateLimitStats())
+            stats.waits += 1
+            stats.wait_time += waited
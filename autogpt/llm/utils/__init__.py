@@ -1,19 +1,26 @@
 from __future__ import annotations
 
+import random
+import time
 from dataclasses import asdict
-from typing import List, Literal, Optional
+from typing import Callable, List, Literal, Optional
 
 from colorama import Fore
+from openai.error import APIConnectionError, APIError, Timeout
+from openai.openai_object import OpenAIObject
+from requests import RequestException
 
 from autogpt.config import Config
 from autogpt.logs import logger
 
 from ..api_manager import ApiManager
 from ..base import ChatModelResponse, ChatSequence, Message
+from ..completion_cache import CachedCompletion, CompletionCache, get_completion_cache
 from ..providers import openai as iopenai
 from ..providers.openai import (
     OPEN_AI_CHAT_MODELS,
     OpenAIFunctionCall,
+    OpenAIFunctions,
     OpenAIFunctionSpec,
 )
 from .token_counter import *
@@ -94,10 +101,11 @@ def create_text_completion(
 def create_chat_completion(
     prompt: ChatSequence,
     config: Config,
-    functions: Optional[List[OpenAIFunctionSpec]] = None,
+    functions: Optional[List[OpenAIFunctionSpec] | OpenAIFunctions] = None,
     model: Optional[str] = None,
     temperature: Optional[float] = None,
     max_tokens: Optional[int] = None,
+    on_delta: Optional[Callable[[str], bool]] = None,
 ) -> ChatModelResponse:
     """Create a chat completion using the OpenAI API
 
@@ -106,6 +114,12 @@ def create_chat_completion(
         model (str, optional): The model to use. Defaults to None.
         temperature (float, optional): The temperature to use. Defaults to 0.9.
         max_tokens (int, optional): The max tokens to use. Defaults to None.
+        functions (list[OpenAIFunctionSpec] | OpenAIFunctions, optional): The
+            functions that the model may call. Defaults to None.
+        on_delta (Callable[[str], bool], optional): If given, the response is
+            streamed and every piece of content is passed to this callback as it is
+            received, until the callback returns True. The rest of the response is
+            still received and returned.
 
     Returns:
         str: The response from the chat completion
@@ -142,25 +156,52 @@ def create_chat_completion(
         chat_completion_kwargs[
             "deployment_id"
         ] = config.get_azure_deployment_id_for_model(model)
-    if functions:
+    if isinstance(functions, OpenAIFunctions):
+        if functions:
+            chat_completion_kwargs["functions"] = functions.payload
+    elif functions:
         chat_completion_kwargs["functions"] = [
             function.__dict__ for function in functions
         ]
         logger.debug(f"Function dicts: {chat_completion_kwargs['functions']}")
 
-    response = iopenai.create_chat_completion(
-        messages=prompt.raw(),
-        **chat_completion_kwargs,
-    )
-    logger.debug(f"Response: {response}")
-
-    if hasattr(response, "error"):
-        logger.error(response.error)
-        raise RuntimeError(response.error)
-
-    first_message = response.choices[0].message
-    content: str | None = first_message.get("content")
-    function_call: OpenAIFunctionCall | None = first_message.get("function_call")
+    # Only deterministic completions are cached
+    cache = get_completion_cache(config) if temperature == 0 else None
+
+    if on_delta is not None:
+        content, function_call = _stream_chat_completion(
+            prompt, on_delta, chat_completion_kwargs, functions
+        )
+    elif cache is not None:
+        key = CompletionCache.key(
+            model,
+            prompt.raw(),
+            chat_completion_kwargs.get("functions"),
+            temperature,
+            max_tokens,
+        )
+        completion, hit = cache.get_or_create(
+            key,
+            lambda: CachedCompletion.from_response(
+                _request_chat_completion(prompt, chat_completion_kwargs)
+            ),
+        )
+        api_manager = ApiManager()
+        api_manager.update_cache_stats(
+            hit, completion.prompt_tokens, completion.completion_tokens, model
+        )
+        if hit:
+            logger.debug(
+                f"Completion cache hit ({api_manager.get_cache_hit_rate():.0%} hit "
+                f"rate, {api_manager.saved_prompt_tokens} prompt tokens and "
+                f"{api_manager.saved_completion_tokens} completion tokens saved)"
+            )
+        content, function_call = completion.content, completion.function_call
+    else:
+        response = _request_chat_completion(prompt, chat_completion_kwargs)
+        first_message = response.choices[0].message
+        content: str | None = first_message.get("content")
+        function_call: OpenAIFunctionCall | None = first_message.get("function_call")
 
     for plugin in config.plugins:
         if not plugin.can_handle_on_response():
@@ -174,6 +215,134 @@ def create_chat_completion(
     )
 
 
+def _request_chat_completion(
+    prompt: ChatSequence, chat_completion_kwargs: dict
+) -> OpenAIObject:
+    response = iopenai.create_chat_completion(
+        messages=prompt.raw(),
+        **chat_completion_kwargs,
+    )
+    logger.debug(f"Response: {response}")
+
+    if hasattr(response, "error"):
+        logger.error(response.error)
+        raise RuntimeError(response.error)
+    return response
+
+
+def _stream_chat_completion(
+    prompt: ChatSequence,
+    on_delta: Callable[[str], bool],
+    chat_completion_kwargs: dict,
+    functions: Optional[List[OpenAIFunctionSpec] | OpenAIFunctions] = None,
+    num_retries: int = 3,
+    backoff_base: float = 2.0,
+) -> tuple[str | None, OpenAIFunctionCall | None]:
+    """Receives a streamed chat completion, passing its content on to `on_delta`
+
+    The whole stream is received even after `on_delta` returns True, so the result
+    is the same as that of a request that isn't streamed. If the stream breaks off,
+    the completion is requested again and `on_delta` only gets the content that it
+    hasn't received yet. The error is raised if the new completion doesn't repeat
+    the content that was already passed on.
+    """
+    passed_on: list[str] = []
+    listening = True
+    opened = False
+
+    def receive() -> tuple[str, str, str]:
+        nonlocal listening, opened
+        replay = "".join(passed_on)
+        content_pieces: list[str] = []
+        function_name_pieces: list[str] = []
+        function_argument_pieces: list[str] = []
+        length = 0
+
+        stream = iopenai.stream_chat_completion(
+            messages=prompt.raw(),
+            **chat_completion_kwargs,
+        )
+        try:
+            for delta in stream:
+                opened = True
+                if "function_call" in delta:
+                    function_name_pieces.append(delta.function_call.get("name", ""))
+                    function_argument_pieces.append(
+                        delta.function_call.get("arguments", "")
+                    )
+                piece = delta.get("content")
+                if not piece:
+                    continue
+                content_pieces.append(piece)
+                start, length = length, length + len(piece)
+                if start < len(replay):
+                    # This content was passed on before the stream broke off
+                    if piece[: len(replay) - start] != replay[start:length]:
+                        raise _StreamDiverged()
+                    piece = piece[len(replay) - start :]
+                if listening and piece:
+                    passed_on.append(piece)
+                    listening = not on_delta(piece)
+        finally:
+            stream.close()
+        if length < len(replay):
+            raise _StreamDiverged()
+        return (
+            "".join(content_pieces),
+            "".join(function_name_pieces),
+            "".join(function_argument_pieces),
+        )
+
+    for attempt in range(1, num_retries + 2):
+        # Errors that occur before the stream is opened have already been retried
+        opened = False
+        try:
+            content, function_name, function_arguments = receive()
+            break
+        except STREAM_ERRORS as e:
+            if not opened or attempt > num_retries:
+                raise
+            error = e
+        except _StreamDiverged:
+            raise error
+        backoff = random.uniform(0.5, 1) * backoff_base**attempt
+        logger.warn(
+            f"Chat completion stream broke off ({error}), retrying in {backoff:.1f}s"
+        )
+        time.sleep(backoff)
+
+    function_call = None
+    if function_name:
+        function_call = OpenAIFunctionCall(
+            name=function_name, arguments=function_arguments
+        )
+    logger.debug(f"Streamed response: {content}, function call: {function_call}")
+
+    # Streamed responses don't report their usage, so it is counted here
+    model = chat_completion_kwargs["model"]
+    prompt_tokens = prompt.token_length
+    if isinstance(functions, OpenAIFunctions):
+        prompt_tokens += functions.count_tokens(model)
+    elif functions:
+        prompt_tokens += iopenai.count_openai_functions_tokens(functions, model)
+    completion_tokens = count_string_tokens(content, model)
+    if function_call:
+        completion_tokens += count_string_tokens(
+            function_call.name + function_call.arguments, model
+        )
+    ApiManager().update_cost(prompt_tokens, completion_tokens, model)
+
+    return content or None, function_call
+
+
+# Errors that break off a stream
+STREAM_ERRORS = (APIError, APIConnectionError, Timeout, RequestException)
+
+
+class _StreamDiverged(Exception):
+    """A retried stream doesn't repeat the content that was already passed on"""
+
+
 def check_model(
     model_name: str, model_type: Literal["smart_llm_model", "fast_llm_model"]
 ) -> str:
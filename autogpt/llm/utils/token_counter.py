@@ -1,6 +1,7 @@
 """Functions for counting the number of tokens in a message or string."""
 from __future__ import annotations
 
+import functools
 from typing import List
 
 import tiktoken
@@ -8,6 +9,36 @@ import tiktoken
 from autogpt.llm.base import Message
 from autogpt.logs import logger
 
+ENCODE_BATCH_MIN_SIZE = 16
+"""Below this number of texts, encoding them one by one is faster than encode_batch"""
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    """
+    Returns the tokenizer for a model. The encoding of each model is resolved once.
+
+    Args:
+        model_name (str): The name of the model (e.g., "gpt-3.5-turbo")
+
+    Returns:
+        tiktoken.Encoding: The encoding of the model, or cl100k_base if the model
+            is unknown to tiktoken.
+    """
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        logger.warn(
+            f"Warning: model {model_name} not found. Using cl100k_base encoding."
+        )
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _count_tokens(texts: List[str], encoding: tiktoken.Encoding) -> List[int]:
+    if len(texts) < ENCODE_BATCH_MIN_SIZE:
+        return [len(encoding.encode(text)) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(texts)]
+
 
 def count_message_tokens(
     messages: List[Message], model: str = "gpt-3.5-turbo-0301"
@@ -24,15 +55,32 @@ def count_message_tokens(
     Returns:
         int: The number of tokens used by the list of messages.
     """
+    num_tokens = sum(count_tokens_per_message(messages, model))
+    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+    return num_tokens
+
+
+def count_tokens_per_message(messages: List[Message], model: str) -> List[int]:
+    """
+    Returns the number of tokens that each message adds to a chat prompt.
+
+    The token count of a message is remembered on the message itself, so messages
+    that are counted again are not re-tokenized unless their content has changed.
+
+    Args:
+        messages (list): A list of messages.
+        model (str): The name of the model to use for tokenization.
+
+    Returns:
+        list[int]: The number of tokens of each message.
+    """
     if model.startswith("gpt-3.5-turbo"):
         tokens_per_message = (
             4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
         )
-        tokens_per_name = -1  # if there's a name, the role is omitted
         encoding_model = "gpt-3.5-turbo"
     elif model.startswith("gpt-4"):
         tokens_per_message = 3
-        tokens_per_name = 1
         encoding_model = "gpt-4"
     else:
         raise NotImplementedError(
@@ -40,21 +88,38 @@ def count_message_tokens(
             " See https://github.com/openai/openai-python/blob/main/chatml.md for"
             " information on how messages are converted to tokens."
         )
-    try:
-        encoding = tiktoken.encoding_for_model(encoding_model)
-    except KeyError:
-        logger.warn("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.raw().items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
+    encoding = get_encoding(encoding_model)
+
+    counts: List[int] = []
+    uncounted: List[int] = []
+    for i, message in enumerate(messages):
+        cached = message._token_counts.get(encoding.name)
+        if (
+            cached is not None
+            and cached[0] == message.role
+            and cached[1] == message.content
+        ):
+            counts.append(cached[2])
+        else:
+            counts.append(0)
+            uncounted.append(i)
+
+    if uncounted:
+        texts = [
+            text for i in uncounted for text in (messages[i].role, messages[i].content)
+        ]
+        text_lengths = _count_tokens(texts, encoding)
+        for j, i in enumerate(uncounted):
+            message = messages[i]
+            count = text_lengths[2 * j] + text_lengths[2 * j + 1]
+            message._token_counts[encoding.name] = (
+                message.role,
+                message.content,
+                count,
+            )
+            counts[i] = count
+
+    return [tokens_per_message + count for count in counts]
 
 
 def count_string_tokens(string: str, model_name: str) -> int:
@@ -68,5 +133,18 @@ def count_string_tokens(string: str, model_name: str) -> int:
     Returns:
         int: The number of tokens in the text string.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
-    return len(encoding.encode(string))
+    return len(get_encoding(model_name).encode(string))
+
+
+def count_string_tokens_batch(strings: List[str], model_name: str) -> List[int]:
+    """
+    Returns the number of tokens in each of a number of text strings.
+
+    Args:
+        strings (list[str]): The text strings.
+        model_name (str): The name of the encoding to use. (e.g., "gpt-3.5-turbo")
+
+    Returns:
+        list[int]: The number of tokens in each text string.
+    """
+    return _count_tokens(strings, get_encoding(model_name))
@@ -1,6 +1,11 @@
+import atexit
+import gzip
 import json
 import os
-from typing import Any, Dict, Union
+import queue
+import threading
+import weakref
+from typing import Any, Dict, Optional, Union
 
 from autogpt.logs import logger
 
@@ -13,22 +18,52 @@ SUMMARY_FILE_NAME = "summary.txt"
 SUPERVISOR_FEEDBACK_FILE_NAME = "supervisor_feedback.txt"
 PROMPT_SUPERVISOR_FEEDBACK_FILE_NAME = "prompt_supervisor_feedback.json"
 USER_INPUT_FILE_NAME = "user_input.txt"
+JSONL_FILE_NAME = "cycles.jsonl.gz"
+
+MAX_QUEUED_LOGS = 1000
+
+_created_directories: set[str] = set()
 
 
 class LogCycleHandler:
     """
     A class for logging cycle data.
+
+    The logs are serialized and written in the order in which they are made, by a
+    background thread of the handler, so logging doesn't wait for the disk; logged
+    data must not be changed afterwards. When more than MAX_QUEUED_LOGS logs are
+    waiting to be written, logging waits until there is room. `close` stops the
+    thread; the logs of all handlers are written before the process exits.
+
+    Attributes:
+        history_delta (bool): Whether logs of the full message history only contain
+            the messages that were added since the last one.
+        jsonl (bool): Whether the logs of a session are written to one compressed
+            JSONL file instead of a file per log.
     """
 
-    def __init__(self):
+    _handlers: "weakref.WeakSet[LogCycleHandler]" = weakref.WeakSet()
+
+    def __init__(self, history_delta: bool = False, jsonl: bool = False):
         self.log_count_within_cycle = 0
+        self.history_delta = history_delta
+        self.jsonl = jsonl
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[Optional[tuple]] = queue.Queue(MAX_QUEUED_LOGS)
+        self._writer: Optional[threading.Thread] = None
+        self._history_lengths: dict[str, int] = {}
+        self._jsonl_files: dict[str, gzip.GzipFile] = {}
+        self._jsonl_files_lock = threading.Lock()
+        LogCycleHandler._handlers.add(self)
 
     @staticmethod
     def create_directory_if_not_exists(directory_path: str) -> None:
-        if not os.path.exists(directory_path):
-            os.makedirs(directory_path, exist_ok=True)
+        if directory_path in _created_directories:
+            return
+        os.makedirs(directory_path, exist_ok=True)
+        _created_directories.add(directory_path)
 
-    def create_outer_directory(self, ai_name: str, created_at: str) -> str:
+    def get_outer_directory_path(self, ai_name: str, created_at: str) -> str:
         log_directory = logger.get_log_directory()
 
         if os.environ.get("OVERWRITE_DEBUG") == "1":
@@ -37,7 +72,10 @@ class LogCycleHandler:
             ai_name_short = self.get_agent_short_name(ai_name)
             outer_folder_name = f"{created_at}_{ai_name_short}"
 
-        outer_folder_path = os.path.join(log_directory, "DEBUG", outer_folder_name)
+        return os.path.join(log_directory, "DEBUG", outer_folder_name)
+
+    def create_outer_directory(self, ai_name: str, created_at: str) -> str:
+        outer_folder_path = self.get_outer_directory_path(ai_name, created_at)
         self.create_directory_if_not_exists(outer_folder_path)
 
         return outer_folder_path
@@ -69,20 +107,120 @@ class LogCycleHandler:
         file_name: str,
     ) -> None:
         """
-        Log cycle data to a JSON file.
+        Log cycle data to a JSON file, which is written in the background.
 
         Args:
             data (Any): The data to be logged.
             file_name (str): The name of the file to save the logged data.
         """
-        nested_folder_path = self.create_nested_directory(
-            ai_name, created_at, cycle_count
-        )
-
-        json_data = json.dumps(data, ensure_ascii=False, indent=4)
-        log_file_path = os.path.join(
-            nested_folder_path, f"{self.log_count_within_cycle}_{file_name}"
-        )
+        outer_folder_path = self.get_outer_directory_path(ai_name, created_at)
+
+        # Log calls may come from several threads, each must get its own file
+        with self._lock:
+            log_count = self.log_count_within_cycle
+            self.log_count_within_cycle += 1
+
+            if (
+                self.history_delta
+                and file_name == FULL_MESSAGE_HISTORY_FILE_NAME
+                and isinstance(data, list)
+            ):
+                logged_length = self._history_lengths.get(outer_folder_path, 0)
+                self._history_lengths[outer_folder_path] = len(data)
+                # A history that got shorter is logged in full
+                if len(data) >= logged_length:
+                    data = data[logged_length:]
+
+            if self._writer is None:
+                self._queue = queue.Queue(MAX_QUEUED_LOGS)
+                self._writer = threading.Thread(
+                    target=self._write_logs,
+                    args=(self._queue,),
+                    name="log_cycle",
+                    daemon=True,
+                )
+                self._writer.start()
+
+            # Enqueued under the lock, so a log can't end up behind the end of a
+            # writer that `close` is stopping
+            self._queue.put(
+                (outer_folder_path, cycle_count, log_count, file_name, data)
+            )
+
+    def flush(self) -> None:
+        """Waits until all logs that have been made are written"""
+        self._queue.join()
+        with self._jsonl_files_lock:
+            for jsonl_file in self._jsonl_files.values():
+                jsonl_file.flush()
+
+    def close(self) -> None:
+        """
+        Writes all logs that have been made, stops the writer thread and closes the
+        session files. Logging again afterwards starts a new writer thread.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._queue.put(None)
+        if writer is not None:
+            writer.join()
+        with self._jsonl_files_lock:
+            for jsonl_file in self._jsonl_files.values():
+                jsonl_file.close()
+            self._jsonl_files.clear()
+
+    def _write_logs(self, logs: "queue.Queue[Optional[tuple]]") -> None:
+        while (log := logs.get()) is not None:
+            try:
+                self._write(*log)
+            except Exception as e:
+                logger.warn(f"Failed to write cycle log {log[3]}: {e}")
+            finally:
+                logs.task_done()
+        logs.task_done()
+
+    def _write(
+        self,
+        outer_folder_path: str,
+        cycle_count: int,
+        log_count: int,
+        file_name: str,
+        data: Any,
+    ) -> None:
+        if self.jsonl:
+            record = {
+                "cycle": cycle_count,
+                "log_count": log_count,
+                "file_name": file_name,
+                "data": data,
+            }
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with self._jsonl_files_lock:
+                jsonl_file = self._jsonl_files.get(outer_folder_path)
+                if jsonl_file is None:
+                    self.create_directory_if_not_exists(outer_folder_path)
+                    jsonl_file = gzip.open(
+                        os.path.join(outer_folder_path, JSONL_FILE_NAME), "ab"
+                    )
+                    self._jsonl_files[outer_folder_path] = jsonl_file
+                jsonl_file.write(line.encode("utf-8"))
+            return
 
-        logger.log_json(json_data, log_file_path)
-        self.log_count_within_cycle += 1
+        nested_folder_path = self.create_inner_directory(outer_folder_path, cycle_count)
+        log_file_path = os.path.join(nested_folder_path, f"{log_count}_{file_name}")
+        try:
+            f = open(log_file_path, "w", encoding="utf-8")
+        except FileNotFoundError:
+            # The directory was removed after it was created
+            _created_directories.discard(nested_folder_path)
+            self.create_directory_if_not_exists(nested_folder_path)
+            f = open(log_file_path, "w", encoding="utf-8")
+        with f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+@atexit.register
+def _close_handlers() -> None:
+    for handler in list(LogCycleHandler._handlers):
+        handler.close()
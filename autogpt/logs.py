@@ -1,11 +1,15 @@
 """Logging module for Auto-GPT."""
+import atexit
 import logging
 import os
+import queue
 import random
 import re
+import sys
+import threading
 import time
 from logging import LogRecord
-from typing import Any
+from typing import Any, TextIO
 
 from colorama import Fore, Style
 
@@ -34,13 +38,16 @@ class Logger(metaclass=Singleton):
 
         console_formatter = AutoGptFormatter("%(title_color)s %(message)s")
 
+        # Console output is written by a thread of its own, in order
+        self.console_output = ConsoleOutput()
+
         # Create a handler for console which simulate typing
-        self.typing_console_handler = TypingConsoleHandler()
+        self.typing_console_handler = TypingConsoleHandler(self.console_output)
         self.typing_console_handler.setLevel(logging.INFO)
         self.typing_console_handler.setFormatter(console_formatter)
 
         # Create a handler for console without typing simulation
-        self.console_handler = ConsoleHandler()
+        self.console_handler = ConsoleHandler(self.console_output)
         self.console_handler.setLevel(logging.DEBUG)
         self.console_handler.setFormatter(console_formatter)
 
@@ -186,33 +193,128 @@ Output stream to console using simulated typing
 """
 
 
-class TypingConsoleHandler(logging.StreamHandler):
-    def emit(self, record):
+class ConsoleOutput:
+    """
+    Writes the console output of the loggers in order. Typed and buffered output is
+    written by a thread of its own, so logging doesn't wait for the console, e.g.
+    while a message is being typed.
+
+    Modes:
+        typing: typed messages appear word by word, if stdout is a terminal
+        plain: every message is written and flushed at once
+        buffered: messages are collected and written in one go when no more output
+            is waiting, for the highest throughput
+
+    Attributes:
+        mode (str): The output mode, "typing", "plain" or "buffered".
+        time_spent (float): The total number of seconds spent writing output.
+    """
+
+    def __init__(self, mode: str = "typing"):
+        self.mode = mode
+        self.time_spent = 0.0
+        self._queue: queue.Queue[tuple[str, str, bool]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        atexit.register(self.flush)
+
+    @property
+    def busy(self) -> bool:
+        """Whether any output is waiting to be written"""
+        return self._queue.unfinished_tasks > 0
+
+    def write(self, text: str, end: str = "\n", typing: bool = False) -> None:
+        """
+        Writes text to stdout, optionally by simulated typing. Text that is typed or
+        buffered, or that has to wait for such text, is written by the output thread.
+        """
+        with self._lock:
+            if (
+                self._queue.unfinished_tasks == 0
+                and self.mode != "buffered"
+                and not (typing and self.mode == "typing" and sys.stdout.isatty())
+            ):
+                start = time.perf_counter()
+                sys.stdout.write(text + end)
+                sys.stdout.flush()
+                self.time_spent += time.perf_counter() - start
+                return
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._write_output, name="console_output", daemon=True
+                )
+                self._thread.start()
+            self._queue.put((text, end, typing))
+
+    def flush(self) -> None:
+        """Waits until all queued output is written, e.g. before asking for input"""
+        self._queue.join()
+
+    def _write_output(self) -> None:
+        buffer: list[str] = []
+        while True:
+            text, end, typing = self._queue.get()
+            start = time.perf_counter()
+            try:
+                stream = sys.stdout
+                if self.mode == "buffered":
+                    buffer.append(text + end)
+                    if self._queue.qsize() == 0:
+                        stream.write("".join(buffer))
+                        stream.flush()
+                        buffer.clear()
+                elif typing and self.mode == "typing" and stream.isatty():
+                    self._type(stream, text, end)
+                else:
+                    stream.write(text + end)
+                    stream.flush()
+            except Exception:
+                buffer.clear()
+            finally:
+                self.time_spent += time.perf_counter() - start
+                self._queue.task_done()
+
+    @staticmethod
+    def _type(stream: TextIO, text: str, end: str) -> None:
         min_typing_speed = 0.05
         max_typing_speed = 0.01
 
-        msg = self.format(record)
+        words = text.split()
+        for i, word in enumerate(words):
+            stream.write(word)
+            if i < len(words) - 1:
+                stream.write(" ")
+            stream.flush()
+            typing_speed = random.uniform(min_typing_speed, max_typing_speed)
+            time.sleep(typing_speed)
+            # type faster after each word
+            min_typing_speed = min_typing_speed * 0.95
+            max_typing_speed = max_typing_speed * 0.95
+        stream.write(end)
+        stream.flush()
+
+
+class TypingConsoleHandler(logging.StreamHandler):
+    def __init__(self, output: ConsoleOutput):
+        super().__init__()
+        self.output = output
+
+    def emit(self, record):
         try:
-            words = msg.split()
-            for i, word in enumerate(words):
-                print(word, end="", flush=True)
-                if i < len(words) - 1:
-                    print(" ", end="", flush=True)
-                typing_speed = random.uniform(min_typing_speed, max_typing_speed)
-                time.sleep(typing_speed)
-                # type faster after each word
-                min_typing_speed = min_typing_speed * 0.95
-                max_typing_speed = max_typing_speed * 0.95
-            print()
+            self.output.write(self.format(record), typing=True)
         except Exception:
             self.handleError(record)
 
 
 class ConsoleHandler(logging.StreamHandler):
+    def __init__(self, output: ConsoleOutput):
+        super().__init__()
+        self.output = output
+
     def emit(self, record) -> None:
-        msg = self.format(record)
         try:
-            print(msg)
+            self.output.write(self.format(record))
         except Exception:
             self.handleError(record)
 
@@ -250,6 +352,7 @@ def remove_color_codes(s: str) -> str:
 
 
 logger = Logger()
+console_output = logger.console_output
 
 
 def print_assistant_thoughts(
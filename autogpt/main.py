@@ -7,6 +7,7 @@ from colorama import Fore, Style
 from autogpt.agent import Agent
 from autogpt.config import Config, check_openai_api_key
 from autogpt.configurator import create_config
+from autogpt.llm.rate_limiter import RateLimiter
 from autogpt.logs import logger
 from autogpt.memory.vector import get_memory
 from autogpt.models.command_registry import CommandRegistry
@@ -53,6 +54,7 @@ def run_auto_gpt(
     logger.speak_mode = speak
 
     config = Config()
+    logger.console_output.mode = config.console_output_mode
     # TODO: fill in llm values here
     check_openai_api_key(config)
 
@@ -73,6 +75,10 @@ def run_auto_gpt(
         skip_news,
     )
 
+    RateLimiter().configure(
+        config.openai_requests_per_minute, config.openai_tokens_per_minute
+    )
+
     if config.continuous_mode:
         for line in get_legal_warning().split("\n"):
             logger.warn(markdown_to_ansi_style(line), "LEGAL:", Fore.RED)
@@ -135,8 +141,9 @@ def run_auto_gpt(
         f"The following command categories are enabled: {enabled_command_categories}"
     )
 
+    # The command modules are only imported when one of their commands is first used
     for command_category in enabled_command_categories:
-        command_registry.import_commands(command_category)
+        command_registry.import_commands(command_category, lazy=True)
 
     ai_name = ""
     ai_config = construct_main_ai_config(config)
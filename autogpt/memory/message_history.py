@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import bisect
 import copy
 import json
 from dataclasses import dataclass, field
@@ -9,10 +10,15 @@ if TYPE_CHECKING:
     from autogpt.agent import Agent
 
 from autogpt.config import Config
-from autogpt.json_utils.utilities import extract_json_from_response
+from autogpt.json_utils.utilities import extract_json_from_message
 from autogpt.llm.base import ChatSequence, Message, MessageRole, MessageType
 from autogpt.llm.providers.openai import OPEN_AI_CHAT_MODELS
-from autogpt.llm.utils import count_string_tokens, create_chat_completion
+from autogpt.llm.utils import (
+    count_message_tokens,
+    count_string_tokens,
+    count_string_tokens_batch,
+    create_chat_completion,
+)
 from autogpt.log_cycle.log_cycle import PROMPT_SUMMARY_FILE_NAME, SUMMARY_FILE_NAME
 from autogpt.logs import logger
 
@@ -26,6 +32,18 @@ class MessageHistory:
 
     last_trimmed_index: int = 0
 
+    _cycles: list[tuple[Message | None, Message, Message]] = field(
+        default_factory=list, init=False, repr=False
+    )
+    """The valid cycles in `messages`, parsed incrementally by _update_cycles"""
+    _cycles_of: list[Message] | None = field(default=None, init=False, repr=False)
+    """The list of messages that `_cycles` was parsed from"""
+    _next_ai_message_index: int = field(default=0, init=False, repr=False)
+    _cycle_token_sums: dict[str, list[int]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    """Running sum of the token counts of `_cycles`, per model"""
+
     def __getitem__(self, i: int):
         return self.messages[i]
 
@@ -62,25 +80,26 @@ class MessageHistory:
             list[Message]: A list of messages that are in full_message_history with an index higher than last_trimmed_index and absent from current_message_chain.
         """
         # Select messages in full_message_history with an index higher than last_trimmed_index
-        new_messages = [
-            msg for i, msg in enumerate(self) if i > self.last_trimmed_index
-        ]
+        first_new_index = self.last_trimmed_index + 1
 
         # Remove messages that are already present in current_message_chain
-        new_messages_not_in_chain = [
-            msg for msg in new_messages if msg not in current_message_chain
+        ids_in_chain = {msg.sequence_id for msg in current_message_chain}
+        new_indices_not_in_chain = [
+            i
+            for i, msg in enumerate(self.messages[first_new_index:], first_new_index)
+            if msg.sequence_id not in ids_in_chain
         ]
 
-        if not new_messages_not_in_chain:
+        if not new_indices_not_in_chain:
             return self.summary_message(), []
 
+        new_messages_not_in_chain = [self.messages[i] for i in new_indices_not_in_chain]
         new_summary_message = self.update_running_summary(
             new_events=new_messages_not_in_chain, config=config
         )
 
-        # Find the index of the last message processed
-        last_message = new_messages_not_in_chain[-1]
-        self.last_trimmed_index = self.messages.index(last_message)
+        # Remember the index of the last message processed
+        self.last_trimmed_index = new_indices_not_in_chain[-1]
 
         return new_summary_message, new_messages_not_in_chain
 
@@ -91,26 +110,97 @@ class MessageHistory:
             Message: a message from the AI containing a proposed action
             Message: the message containing the result of the AI's proposed action
         """
-        messages = messages or self.messages
+        if not messages:
+            self._update_cycles()
+            yield from self._cycles
+            return
+
         for i in range(0, len(messages) - 1):
-            ai_message = messages[i]
-            if ai_message.type != "ai_response":
-                continue
-            user_message = (
-                messages[i - 1] if i > 0 and messages[i - 1].role == "user" else None
+            cycle = self._parse_cycle(messages, i)
+            if cycle:
+                yield cycle
+
+    def context_window(self, model: str, token_limit: int) -> tuple[list[Message], int]:
+        """
+        Returns the messages of the most recent cycles that fit in a token limit.
+
+        The history is parsed into cycles incrementally, and the token counts of the
+        cycles are kept as a running sum, so only the messages added since the last
+        call are processed.
+
+        Args:
+            model (str): The model to count the tokens for.
+            token_limit (int): The maximum number of tokens of the returned messages.
+
+        Returns:
+            list[Message]: The messages of the most recent cycles, oldest first.
+            int: The number of tokens of those messages, counted per cycle.
+        """
+        self._update_cycles()
+
+        token_sums = self._cycle_token_sums.setdefault(model, [0])
+        for cycle in self._cycles[len(token_sums) - 1 :]:
+            cycle_messages = [msg for msg in cycle if msg is not None]
+            token_sums.append(
+                token_sums[-1] + count_message_tokens(cycle_messages, model)
             )
-            result_message = messages[i + 1]
-            try:
-                assert (
-                    extract_json_from_response(ai_message.content) != {}
-                ), "AI response is not a valid JSON object"
-                assert result_message.type == "action_result"
-
-                yield user_message, ai_message, result_message
-            except AssertionError as err:
-                logger.debug(
-                    f"Invalid item in message history: {err}; Messages: {messages[i-1:i+2]}"
-                )
+
+        # The window is the longest run of most recent cycles within the limit
+        total = token_sums[-1]
+        first_cycle = min(
+            bisect.bisect_left(token_sums, total - token_limit), len(self._cycles)
+        )
+        messages = [
+            msg
+            for cycle in self._cycles[first_cycle:]
+            for msg in cycle
+            if msg is not None
+        ]
+        return messages, total - token_sums[first_cycle]
+
+    def _update_cycles(self) -> None:
+        """Parses the cycles in the messages that were added since the last call"""
+        messages = self.messages
+        if self._cycles_of is not messages or (
+            len(messages) <= self._next_ai_message_index
+        ):
+            # The messages were replaced or removed; start over
+            self._cycles = []
+            self._cycles_of = messages
+            self._next_ai_message_index = 0
+            self._cycle_token_sums = {}
+
+        for i in range(self._next_ai_message_index, len(messages) - 1):
+            cycle = self._parse_cycle(messages, i)
+            if cycle:
+                self._cycles.append(cycle)
+        self._next_ai_message_index = max(
+            self._next_ai_message_index, len(messages) - 1
+        )
+
+    @staticmethod
+    def _parse_cycle(
+        messages: list[Message], i: int
+    ) -> tuple[Message | None, Message, Message] | None:
+        ai_message = messages[i]
+        if ai_message.type != "ai_response":
+            return None
+        user_message = (
+            messages[i - 1] if i > 0 and messages[i - 1].role == "user" else None
+        )
+        result_message = messages[i + 1]
+        try:
+            assert (
+                extract_json_from_message(ai_message) != {}
+            ), "AI response is not a valid JSON object"
+            assert result_message.type == "action_result"
+
+            return user_message, ai_message, result_message
+        except AssertionError as err:
+            logger.debug(
+                f"Invalid item in message history: {err}; Messages: {messages[i-1:i+2]}"
+            )
+            return None
 
     def summary_message(self) -> Message:
         return Message(
@@ -140,8 +230,11 @@ class MessageHistory:
         if not new_events:
             return self.summary_message()
 
-        # Create a copy of the new_events list to prevent modifying the original list
-        new_events = copy.deepcopy(new_events)
+        # Create a copy of the new_events list to prevent modifying the original list,
+        # and delete all user messages
+        new_events = copy.deepcopy(
+            [event for event in new_events if event.role != "user"]
+        )
 
         # Replace "assistant" with "you". This produces much better first person past tense results.
         for event in new_events:
@@ -150,9 +243,11 @@ class MessageHistory:
 
                 # Remove "thoughts" dictionary from "content"
                 try:
-                    content_dict = extract_json_from_response(event.content)
-                    if "thoughts" in content_dict:
-                        del content_dict["thoughts"]
+                    content_dict = {
+                        key: value
+                        for key, value in extract_json_from_message(event).items()
+                        if key != "thoughts"
+                    }
                     event.content = json.dumps(content_dict)
                 except json.JSONDecodeError as e:
                     logger.error(f"Error: Invalid JSON: {e}")
@@ -162,10 +257,6 @@ class MessageHistory:
             elif event.role.lower() == "system":
                 event.role = "your computer"
 
-            # Delete all user messages
-            elif event.role == "user":
-                new_events.remove(event)
-
         # Summarize events and current summary in batch to a new running summary
 
         # Assume an upper bound length for the summary prompt template, i.e. Your task is to create a concise running summary...., in summarize_batch func
@@ -177,9 +268,10 @@ class MessageHistory:
         batch_tlength = 0
 
         # TODO Can put a cap on length of total new events and drop some previous events to save API cost, but need to think thru more how to do it without losing the context
-        for event in new_events:
-            event_tlength = count_string_tokens(str(event), config.fast_llm_model)
-
+        event_tlengths = count_string_tokens_batch(
+            [str(event) for event in new_events], config.fast_llm_model
+        )
+        for event, event_tlength in zip(new_events, event_tlengths):
             if (
                 batch_tlength + event_tlength
                 > max_tokens - prompt_template_length - summary_tlength
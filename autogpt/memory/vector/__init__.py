@@ -3,12 +3,13 @@ from autogpt.logs import logger
 
 from .memory_item import MemoryItem, MemoryItemRelevance
 from .providers.base import VectorMemoryProvider as VectorMemory
+from .providers.ivf import IVFMemory
 from .providers.json_file import JSONFileMemory
 from .providers.no_memory import NoMemory
 
 # List of supported memory backends
 # Add a backend to this list if the import attempt is successful
-supported_memory = ["json_file", "no_memory"]
+supported_memory = ["json_file", "ivf", "no_memory"]
 
 # try:
 #     from .providers.redis import RedisMemory
@@ -46,6 +47,9 @@ def get_memory(config: Config) -> VectorMemory:
         case "json_file":
             memory = JSONFileMemory(config)
 
+        case "ivf":
+            memory = IVFMemory(config)
+
         case "pinecone":
             raise NotImplementedError(
                 "The Pinecone memory backend has been rendered incompatible by work on "
@@ -129,6 +133,7 @@ __all__ = [
     "MemoryItem",
     "MemoryItemRelevance",
     "JSONFileMemory",
+    "IVFMemory",
     "NoMemory",
     "VectorMemory",
     # "RedisMemory",
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Sequence
+
+import numpy as np
+
+from autogpt.config import Config
+from autogpt.llm.api_manager import ApiManager
+from autogpt.llm.base import TText
+from autogpt.llm.providers import openai as iopenai
+from autogpt.llm.providers.openai import OPEN_AI_EMBEDDING_MODELS
+from autogpt.logs import logger
+
+EMBEDDING_MAX_INPUTS = 2048
+"""Maximum number of inputs per request to the OpenAI embeddings API"""
+
+EMBEDDING_MAX_REQUEST_TOKENS = 300_000
+"""Maximum number of tokens of all inputs of a request to the OpenAI embeddings API"""
+
+EMBEDDING_MAX_CONCURRENCY = 8
+"""Maximum number of requests that a batch of inputs is sent in at the same time"""
+
+MICRO_BATCH_WINDOW = 0.005
+"""Seconds that a batch waits for inputs from other callers before it is sent"""
+
+
+def split_batches(
+    token_counts: Sequence[int], max_tokens: int, max_inputs: int
+) -> list[range]:
+    """
+    Splits a sequence of inputs into consecutive batches of at most `max_tokens`
+    tokens in total and `max_inputs` inputs. An input that is longer than
+    `max_tokens` by itself is put in a batch of its own.
+
+    Args:
+        token_counts: The number of tokens of each input.
+        max_tokens: The maximum number of tokens per batch.
+        max_inputs: The maximum number of inputs per batch.
+
+    Returns:
+        list[range]: The indices of the inputs in each batch.
+    """
+    batches = []
+    start, tokens = 0, 0
+    for i, count in enumerate(token_counts):
+        if i > start and (tokens + count > max_tokens or i - start >= max_inputs):
+            batches.append(range(start, i))
+            start, tokens = i, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append(range(start, len(token_counts)))
+    return batches
+
+
+def apportion(total: int, weights: Sequence[int]) -> list[int]:
+    """
+    Splits a whole number into parts that are proportional to `weights` and add up
+    to `total`, giving the remainder to the parts that were rounded down the most.
+    """
+    weight_sum = sum(weights)
+    if not weight_sum:
+        weights, weight_sum = [1] * len(weights), len(weights)
+    exact = [total * weight / weight_sum for weight in weights]
+    parts = [int(share) for share in exact]
+    by_remainder = sorted(range(len(exact)), key=lambda i: parts[i] - exact[i])
+    for i in by_remainder[: total - sum(parts)]:
+        parts[i] += 1
+    return parts
+
+
+class EmbeddingBatcher:
+    """
+    Packs the inputs that callers want embedded into as few requests as the limits
+    of the embedding model allow.
+
+    The first caller to submit inputs waits `window` seconds for inputs from other
+    threads, and then sends the pending inputs of all callers, in as many requests
+    at the same time as the limits require. Inputs that are longer than the model
+    allows are not sent, and fail with a ValueError. The embeddings are
+    handed back to each caller in the order of its inputs. The usage of a request is
+    split between its callers by the number of tokens of their inputs, and each
+    caller adds its share to the ApiManager of its own context.
+    """
+
+    max_tokens: int
+    """Maximum number of tokens per input"""
+    max_inputs: int
+    """Maximum number of inputs per request"""
+    max_request_tokens: int
+    """Maximum number of tokens of all inputs of a request"""
+    window: float
+
+    requests: int
+    """Number of requests sent"""
+    inputs: int
+    """Number of inputs embedded"""
+
+    _embed_batch: Callable[[list[str | TText]], list[np.ndarray]]
+    _pending: list[tuple[str | TText, int, Future]]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str | TText]], list[np.ndarray]],
+        max_tokens: int,
+        max_inputs: int = EMBEDDING_MAX_INPUTS,
+        max_request_tokens: int = EMBEDDING_MAX_REQUEST_TOKENS,
+        window: float = MICRO_BATCH_WINDOW,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.max_inputs = max_inputs
+        self.max_request_tokens = max_request_tokens
+        self.window = window
+        self.requests = 0
+        self.inputs = 0
+        self._embed_batch = embed_batch
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def embed(
+        self, inputs: Sequence[str | TText], token_counts: Sequence[int]
+    ) -> list[np.ndarray]:
+        """
+        Embeds a number of inputs, together with the inputs of concurrent callers.
+
+        Args:
+            inputs: The inputs to embed.
+            token_counts: The number of tokens of each input.
+
+        Returns:
+            list[np.ndarray]: The embedding of each input.
+        """
+        futures = [Future() for _ in inputs]
+        accepted = []
+        for input, tokens, future in zip(inputs, token_counts, futures):
+            if tokens > self.max_tokens:
+                future.set_exception(
+                    ValueError(
+                        f"Input of {tokens} tokens is longer than the"
+                        f" {self.max_tokens} tokens that the model allows"
+                    )
+                )
+            else:
+                accepted.append((input, tokens, future))
+        with self._lock:
+            leader = bool(accepted) and not self._pending
+            self._pending.extend(accepted)
+
+        if leader:
+            try:
+                if self.window:
+                    time.sleep(self.window)
+            except BaseException as e:
+                # The followers would otherwise wait for the leader forever
+                for _, _, future in self._take_pending():
+                    future.set_exception(e)
+                raise
+            self._send(self._take_pending())
+
+        wait(futures)
+        usage = [future.result()[1:] for future in futures if not future.exception()]
+        if usage:
+            ApiManager().add_usage(
+                sum(tokens for tokens, _ in usage), 0, sum(cost for _, cost in usage)
+            )
+        return [future.result()[0] for future in futures]
+
+    def _take_pending(self) -> list[tuple[str | TText, int, Future]]:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def _send(self, pending: list[tuple[str | TText, int, Future]]) -> None:
+        """Sends the pending inputs, at the same time if they need several requests"""
+        batches = [
+            [pending[i] for i in batch]
+            for batch in split_batches(
+                [tokens for _, tokens, _ in pending],
+                self.max_request_tokens,
+                self.max_inputs,
+            )
+        ]
+        logger.debug(f"Embedding {len(pending)} inputs in {len(batches)} request(s)")
+        if len(batches) == 1:
+            self._send_batch(batches[0])
+            return
+
+        context = contextvars.copy_context()
+        sends = [
+            _executor.submit(context.copy().run, self._send_batch, items)
+            for items in batches
+        ]
+        try:
+            wait(sends)
+        except BaseException as e:
+            # Requests that were sent resolve their own futures
+            for send, items in zip(sends, batches):
+                if send.cancel():
+                    for _, _, future in items:
+                        future.set_exception(e)
+            raise
+
+    def _send_batch(self, items: list[tuple[str | TText, int, Future]]) -> None:
+        """Sends one request, and resolves the future of each input with its
+        embedding and its share of the prompt tokens and cost of the request"""
+        # The usage is metered here, and added to the callers' ApiManagers by embed
+        usage = ApiManager.create_scoped()
+        try:
+            with usage.scope():
+                embeddings = self._embed_batch([input for input, _, _ in items])
+        except BaseException as e:
+            for _, _, future in items:
+                future.set_exception(e)
+            if isinstance(e, Exception):
+                return
+            raise
+
+        with self._lock:
+            self.requests += 1
+            self.inputs += len(items)
+        token_counts = [tokens for _, tokens, _ in items]
+        token_shares = apportion(usage.total_prompt_tokens, token_counts)
+        for (_, _, future), embedding, tokens in zip(items, embeddings, token_shares):
+            cost = (
+                usage.total_cost * tokens / usage.total_prompt_tokens
+                if usage.total_prompt_tokens
+                else 0.0
+            )
+            future.set_result((embedding, tokens, cost))
+
+
+_executor = ThreadPoolExecutor(
+    EMBEDDING_MAX_CONCURRENCY, thread_name_prefix="embedding"
+)
+
+_batchers: dict[tuple, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(config: Config) -> EmbeddingBatcher:
+    """Gets the batcher for the embedding model and API credentials of a config"""
+    model = config.embedding_model
+    if config.use_azure:
+        kwargs = {"engine": config.get_azure_deployment_id_for_model(model)}
+    else:
+        kwargs = {"model": model}
+    api_key = config.openai_api_key
+
+    def embed_batch(inputs: list[str | TText]) -> list[np.ndarray]:
+        logger.debug(
+            f"Getting embeddings for {len(inputs)} inputs with model '{model}'"
+            + (
+                f" via Azure deployment '{kwargs['engine']}'"
+                if config.use_azure
+                else ""
+            )
+        )
+        response = iopenai.create_embedding(inputs, **kwargs, api_key=api_key).data
+        return [
+            np.array(d["embedding"], dtype=np.float32)
+            for d in sorted(response, key=lambda x: x["index"])
+        ]
+
+    key = (model, tuple(kwargs.items()), api_key)
+    with _batchers_lock:
+        if key not in _batchers:
+            model_info = OPEN_AI_EMBEDDING_MODELS.get(model)
+            _batchers[key] = EmbeddingBatcher(
+                embed_batch, model_info.max_tokens if model_info else 8191
+            )
+        return _batchers[key]
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from autogpt.config import Config
+from autogpt.llm.base import TText
+from autogpt.logs import logger
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of embedding vectors, stored in an SQLite database.
+
+    Entries are keyed by a hash of the embedding model and the input as it is sent
+    to the API, so the same text is only ever embedded once per model. When the
+    cache holds more than `max_entries` vectors, the least recently used ones are
+    evicted.
+    """
+
+    QUERY_BATCH_SIZE = 500
+    """Maximum number of keys per query, to stay below SQLite's variable limit"""
+
+    path: Path
+    max_entries: int
+
+    hits: int
+    """Number of inputs served from the cache"""
+    misses: int
+    """Number of inputs that were not in the cache"""
+
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+    _clock: int
+    """Last-used stamp of the most recently used entry"""
+    _size: int
+
+    def __init__(self, path: Path, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL"
+                ")"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+        self._clock, self._size = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0), COUNT(*) FROM embeddings"
+        ).fetchone()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def key(model: str, input: str | TText) -> bytes:
+        """The cache key of an input for a given model"""
+        if isinstance(input, str):
+            data = b"text:" + input.encode("utf-8")
+        else:
+            data = b"tokens:" + np.asarray(input, dtype="<i4").tobytes()
+        return hashlib.sha256(model.encode("utf-8") + b"\0" + data).digest()
+
+    def get_many(
+        self, model: str, inputs: Sequence[str | TText]
+    ) -> list[np.ndarray | None]:
+        """
+        Looks up the embeddings of a number of inputs.
+
+        Returns:
+            list: The cached embedding of each input, or None where it's a miss.
+        """
+        keys = [self.key(model, input) for input in inputs]
+        vectors: dict[bytes, np.ndarray] = {}
+
+        with self._lock:
+            for i in range(0, len(keys), self.QUERY_BATCH_SIZE):
+                batch = keys[i : i + self.QUERY_BATCH_SIZE]
+                rows = self._connection.execute(
+                    "SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({', '.join('?' * len(batch))})",
+                    batch,
+                )
+                vectors.update(
+                    (key, np.frombuffer(vector, dtype=np.float32).copy())
+                    for key, vector in rows
+                )
+
+            if vectors:
+                self._clock += 1
+                with self._connection:
+                    self._connection.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(self._clock, key) for key in vectors],
+                    )
+
+            results = [vectors.get(key) for key in keys]
+            n_hits = sum(v is not None for v in results)
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+
+        return results
+
+    def put_many(
+        self, model: str, inputs: Sequence[str | TText], embeddings: Sequence
+    ) -> None:
+        """Stores the embeddings of a number of inputs, evicting old entries if needed"""
+        if self.max_entries < 1:
+            return
+
+        entries = {
+            self.key(model, input): np.asarray(embedding, dtype=np.float32).tobytes()
+            for input, embedding in zip(inputs, embeddings)
+        }
+
+        with self._lock:
+            self._clock += 1
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) "
+                    "VALUES (?, ?, ?)",
+                    [(key, vector, self._clock) for key, vector in entries.items()],
+                )
+                (self._size,) = self._connection.execute(
+                    "SELECT COUNT(*) FROM embeddings"
+                ).fetchone()
+
+                if self._size > self.max_entries:
+                    logger.debug(
+                        f"Evicting {self._size - self.max_entries} entries "
+                        f"from embedding cache '{self.path}'"
+                    )
+                    self._connection.execute(
+                        "DELETE FROM embeddings WHERE key IN ("
+                        "SELECT key FROM embeddings ORDER BY last_used LIMIT ?"
+                        ")",
+                        (self._size - self.max_entries,),
+                    )
+                    self._size = self.max_entries
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM embeddings")
+            self._size = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_caches: dict[Path, EmbeddingCache] = {}
+
+
+def get_embedding_cache(config: Config) -> EmbeddingCache | None:
+    """Gets the embedding cache of the config, or None if caching is disabled"""
+    cache_directory = config.cache_directory or config.workspace_path
+    if config.embedding_cache_size < 1 or not cache_directory:
+        return None
+
+    path = Path(cache_directory) / "embedding_cache.sqlite3"
+    if path not in _caches:
+        _caches[path] = EmbeddingCache(path, config.embedding_cache_size)
+    cache = _caches[path]
+    cache.max_entries = config.embedding_cache_size
+    return cache
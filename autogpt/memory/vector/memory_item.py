@@ -10,7 +10,12 @@ from autogpt.config import Config
 from autogpt.llm import Message
 from autogpt.llm.utils import count_string_tokens
 from autogpt.logs import logger
-from autogpt.processing.text import chunk_content, split_text, summarize_text
+from autogpt.processing.text import (
+    chunk_content,
+    split_text,
+    summarize_chunks,
+    summarize_text,
+)
 
 from .utils import Embedding, get_embedding
 
@@ -53,27 +58,20 @@ class MemoryItem:
         ]
         logger.debug("Chunks: " + str(chunks))
 
-        chunk_summaries = [
-            summary
-            for summary, _ in [
-                summarize_text(
-                    text_chunk,
-                    config,
-                    instruction=how_to_summarize,
-                    question=question_for_summary,
-                )
-                for text_chunk in chunks
-            ]
-        ]
+        chunk_summaries = summarize_chunks(
+            chunks,
+            config,
+            instruction=how_to_summarize,
+            question=question_for_summary,
+        )
         logger.debug("Chunk summaries: " + str(chunk_summaries))
 
-        e_chunks = get_embedding(chunks, config)
-
         summary = (
             chunk_summaries[0]
             if len(chunks) == 1
             else summarize_text(
                 "\n\n".join(chunk_summaries),
+                config,
                 instruction=how_to_summarize,
                 question=question_for_summary,
             )[0]
@@ -82,7 +80,7 @@ class MemoryItem:
 
         # TODO: investigate search performance of weighted average vs summary
         # e_average = np.average(e_chunks, axis=0, weights=[len(c) for c in chunks])
-        e_summary = get_embedding(summary, config)
+        *e_chunks, e_summary = get_embedding(chunks + [summary], config)
 
         metadata["source_type"] = source_type
 
@@ -207,7 +205,8 @@ class MemoryItemRelevance:
     def of(
         memory_item: MemoryItem, for_query: str, e_query: Embedding | None = None
     ) -> MemoryItemRelevance:
-        e_query = e_query or get_embedding(for_query)
+        if e_query is None:
+            e_query = get_embedding(for_query)
         _, srs, crs = MemoryItemRelevance.calculate_scores(memory_item, e_query)
         return MemoryItemRelevance(
             for_query=for_query,
@@ -1,7 +1,9 @@
+from .ivf import IVFMemory
 from .json_file import JSONFileMemory
 from .no_memory import NoMemory
 
 __all__ = [
+    "IVFMemory",
     "JSONFileMemory",
     "NoMemory",
 ]
@@ -6,13 +6,12 @@ import numpy as np
 
 from autogpt.config.config import Config
 from autogpt.logs import logger
-from autogpt.singleton import AbstractSingleton
 
 from .. import MemoryItem, MemoryItemRelevance
 from ..utils import Embedding, get_embedding
 
 
-class VectorMemoryProvider(MutableSet[MemoryItem], AbstractSingleton):
+class VectorMemoryProvider(MutableSet[MemoryItem]):
     @abc.abstractmethod
     def __init__(self, config: Config):
         pass
@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import orjson
+
+from autogpt.config import Config
+from autogpt.logs import logger
+
+from ..memory_item import MemoryItemRelevance
+from ..utils import get_embedding
+from .json_file import JSONFileMemory
+
+
+class IVFMemory(JSONFileMemory):
+    """
+    Memory backend that stores memories like JSONFileMemory, but searches them with
+    an approximate inverted file (IVF) index: the embeddings are clustered into
+    `n_lists` lists with k-means, and a query is only compared to the embeddings in
+    the `n_probes` lists with the nearest centroids.
+
+    More lists make every list shorter, and fewer probes mean fewer lists to scan;
+    both make searches faster at the cost of recall.
+    """
+
+    MIN_ROWS_FOR_INDEX = 4096
+    """Below this number of embeddings, searches are exhaustive"""
+    TRAINING_SAMPLES_PER_LIST = 64
+    KMEANS_ITERATIONS = 10
+    BATCH_SIZE = 16384
+
+    ivf_path: Path
+    """The centroids and list assignments of the index"""
+    n_lists: int
+    """The number of lists to cluster the embeddings into; 0 means sqrt(n)"""
+    n_probes: int
+    """The number of lists to search for each query"""
+
+    _centroids: np.ndarray | None
+    _labels: np.ndarray
+    """The list of each row of `_embeddings`, or -1 if it isn't assigned yet"""
+    _lists: list[_InvertedList]
+    _n_rows_trained: int
+
+    def __init__(self, config: Config) -> None:
+        self.ivf_path = Path(config.workspace_path) / f"{config.memory_index}.ivf.npz"
+        self.n_lists = config.memory_ivf_lists
+        self.n_probes = config.memory_ivf_probes
+        self._centroids = None
+        self._lists = []
+        self._n_rows_trained = 0
+        super().__init__(config)
+
+    def clear(self):
+        self._centroids = None
+        self._lists = []
+        self._n_rows_trained = 0
+        super().clear()
+        self.ivf_path.unlink(missing_ok=True)
+
+    def get_relevant(
+        self, query: str, k: int, config: Config
+    ) -> Sequence[MemoryItemRelevance]:
+        # Rebuild the index when the number of embeddings has doubled since it was
+        # trained, to keep the lists balanced
+        if (
+            self._n_rows >= self.MIN_ROWS_FOR_INDEX
+            and self._n_rows > 2 * self._n_rows_trained
+        ):
+            self.train_index()
+
+        if (
+            self._centroids is None
+            or self._n_rows < self.MIN_ROWS_FOR_INDEX
+            or len(self) < 1
+            or k < 1
+        ):
+            return super().get_relevant(query, k, config)
+
+        logger.debug(
+            f"Searching for {k} relevant memories for query '{query}'; "
+            f"{len(self)} memories in index, probing {self.n_probes} lists"
+        )
+
+        e_query = np.asarray(get_embedding(query, config), dtype=np.float32)
+        probes = self._top_k(self._centroids @ e_query, self.n_probes)
+        scores = np.concatenate([self._lists[p].scores(e_query) for p in probes])
+        if len(scores) == 0:
+            return []
+
+        owners = np.concatenate([self._lists[p].current_owners for p in probes])
+        candidates, candidate_of_row = np.unique(owners, return_inverse=True)
+        item_scores = np.full(len(candidates), -np.inf, dtype=np.float32)
+        np.maximum.at(item_scores, candidate_of_row, scores)
+
+        # Rank the memories by all of their embeddings, also those in lists that
+        # weren't probed
+        relevances = []
+        for i in candidates[self._top_k(item_scores, k)]:
+            start, end = self._item_rows(i)
+            item_row_scores = self._embeddings[start:end] @ e_query
+            relevances.append(
+                MemoryItemRelevance(
+                    memory_item=self.memories[i],
+                    for_query=query,
+                    summary_relevance_score=item_row_scores[0],
+                    chunk_relevance_scores=item_row_scores[1:],
+                )
+            )
+        return sorted(relevances, key=lambda r: r.score, reverse=True)
+
+    def train_index(self):
+        """(Re)builds the index from the current embeddings using spherical k-means"""
+        n_rows = self._n_rows
+        n_lists = min(self.n_lists or int(np.sqrt(n_rows)), n_rows)
+        logger.debug(f"Training IVF index with {n_lists} lists on {n_rows} embeddings")
+
+        rng = np.random.default_rng(0)
+        embeddings = self._embeddings[:n_rows]
+        sample = embeddings[
+            np.sort(
+                rng.choice(
+                    n_rows,
+                    min(n_rows, n_lists * self.TRAINING_SAMPLES_PER_LIST),
+                    replace=False,
+                )
+            )
+        ]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignment = self._nearest_centroids(sample, centroids)
+            counts = np.bincount(assignment, minlength=n_lists)
+            non_empty = counts > 0
+
+            # Sum the members of each list by sorting them by list
+            members = sample[np.argsort(assignment, kind="stable")]
+            starts = (np.cumsum(counts) - counts)[non_empty]
+            centroids[non_empty] = np.add.reduceat(members, starts)
+
+            # Restart empty lists from a random sample
+            n_empty = n_lists - np.count_nonzero(non_empty)
+            if n_empty:
+                centroids[~non_empty] = sample[rng.choice(len(sample), n_empty)]
+
+            centroids /= np.maximum(
+                np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12
+            )
+
+        self._centroids = centroids
+        self._labels[:n_rows] = self._nearest_centroids(embeddings, centroids)
+        self._n_rows_trained = n_rows
+        self._build_lists()
+        self._save_ivf()
+
+    def load_index(self):
+        self._centroids = None
+        self._lists = []
+        self._n_rows_trained = 0
+        super().load_index()
+        try:
+            loaded = self._load_ivf()
+        except Exception as e:
+            logger.warn(f"Could not load IVF index from file: {e}")
+            loaded = False
+
+        if not loaded:
+            # The index will be rebuilt on the next search
+            logger.debug(f"IVF index '{self.ivf_path}' is missing or out of date")
+            self.ivf_path.unlink(missing_ok=True)
+
+    def compact_index(self):
+        # Compaction preserves the order of the memories, so the index stays valid
+        centroids, n_rows_trained = self._centroids, self._n_rows_trained
+        labels = self._labels[: self._n_rows].copy()
+        self.ivf_path.unlink(missing_ok=True)
+
+        super().compact_index()
+
+        if centroids is not None:
+            self._centroids, self._n_rows_trained = centroids, n_rows_trained
+            self._labels[: len(labels)] = labels
+            self._build_lists()
+            self._save_ivf()
+
+    def _save_ivf(self):
+        log_size = self.file_path.stat().st_size
+        with self.file_path.open("rb") as f:
+            f.seek(max(0, log_size - 256))
+            log_tail = f.read()
+
+        tmp_path = self.ivf_path.with_suffix(".tmp")
+        with tmp_path.open("wb") as f:
+            np.savez(
+                f,
+                centroids=self._centroids,
+                labels=self._labels[: self._n_rows],
+                n_rows_trained=self._n_rows_trained,
+                log_size=log_size,
+                log_tail=np.frombuffer(log_tail, dtype=np.uint8),
+            )
+        os.replace(tmp_path, self.ivf_path)
+
+    def _load_ivf(self) -> bool:
+        """
+        Loads the saved index, if it matches the memories.
+
+        The index is saved together with the size and the tail of the record log
+        at that moment. If the log has since only been appended to, the memories
+        from back then are still in the same place and only the embeddings added
+        afterwards have to be assigned to a list.
+        """
+        if not self.ivf_path.is_file():
+            return False
+
+        with np.load(self.ivf_path) as ivf:
+            centroids = ivf["centroids"]
+            labels = ivf["labels"]
+            n_rows_trained = int(ivf["n_rows_trained"])
+            log_size = int(ivf["log_size"])
+            log_tail = ivf["log_tail"].tobytes()
+
+        if (
+            len(labels) > self._n_rows
+            or centroids.shape[1] != self._embeddings.shape[1]
+        ):
+            return False
+
+        with self.file_path.open("rb") as f:
+            f.seek(log_size - len(log_tail))
+            if f.read(len(log_tail)) != log_tail:
+                return False
+            for line in f:
+                if orjson.loads(line)["op"] != "add":
+                    return False
+
+        self._centroids = centroids
+        self._n_rows_trained = n_rows_trained
+        self._labels[: len(labels)] = labels
+        self._labels[len(labels) : self._n_rows] = self._nearest_centroids(
+            self._embeddings[len(labels) : self._n_rows], centroids
+        )
+        self._build_lists()
+        return True
+
+    def _build_lists(self):
+        labels = self._labels[: self._n_rows]
+        rows_by_list = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=len(self._centroids))
+
+        self._lists = []
+        for start, count in zip(np.cumsum(counts) - counts, counts):
+            rows = rows_by_list[start : start + count]
+            inverted_list = _InvertedList(self._embeddings.shape[1])
+            inverted_list.append(self._embeddings[rows], self._owners[rows])
+            self._lists.append(inverted_list)
+
+    def _reset_embedding_matrix(self, dimensions: int = 0):
+        super()._reset_embedding_matrix(dimensions)
+        self._labels = np.empty(0, dtype=np.int32)
+
+    def _append_embeddings(self, rows: np.ndarray, owner: int):
+        super()._append_embeddings(rows, owner)
+        if len(self._labels) < len(self._owners):
+            labels = np.empty(len(self._owners), dtype=np.int32)
+            labels[: len(self._labels)] = self._labels
+            self._labels = labels
+
+        if self._centroids is None:
+            self._labels[self._n_rows - len(rows) : self._n_rows] = -1
+            return
+
+        labels = self._nearest_centroids(rows, self._centroids)
+        self._labels[self._n_rows - len(rows) : self._n_rows] = labels
+        for label in np.unique(labels):
+            in_list = labels == label
+            self._lists[label].append(
+                rows[in_list], np.full(np.count_nonzero(in_list), owner)
+            )
+
+    def _delete_embeddings(self, owner: int):
+        start, end = self._item_rows(owner)
+        n_rows = self._n_rows
+        super()._delete_embeddings(owner)
+        self._labels[start : start + n_rows - end] = self._labels[end:n_rows]
+        for inverted_list in self._lists:
+            inverted_list.remove(owner)
+
+    @classmethod
+    def _nearest_centroids(
+        cls, embeddings: np.ndarray, centroids: np.ndarray
+    ) -> np.ndarray:
+        labels = np.empty(len(embeddings), dtype=np.int32)
+        for i in range(0, len(embeddings), cls.BATCH_SIZE):
+            batch = embeddings[i : i + cls.BATCH_SIZE]
+            labels[i : i + cls.BATCH_SIZE] = np.argmax(batch @ centroids.T, axis=1)
+        return labels
+
+
+class _InvertedList:
+    """The embeddings in one list of an IVF index, stored contiguously"""
+
+    embeddings: np.ndarray
+    owners: np.ndarray
+    """The index of the memory that each embedding belongs to"""
+    size: int
+
+    def __init__(self, dimensions: int):
+        self.embeddings = np.empty((0, dimensions), dtype=np.float32)
+        self.owners = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    @property
+    def current_owners(self) -> np.ndarray:
+        return self.owners[: self.size]
+
+    def scores(self, e_query: np.ndarray) -> np.ndarray:
+        return self.embeddings[: self.size] @ e_query
+
+    def append(self, embeddings: np.ndarray, owners: np.ndarray):
+        n_new = len(embeddings)
+        if self.size + n_new > len(self.embeddings):
+            capacity = max(2 * len(self.embeddings), self.size + n_new, 16)
+            new_embeddings = np.empty(
+                (capacity, self.embeddings.shape[1]), dtype=np.float32
+            )
+            new_embeddings[: self.size] = self.embeddings[: self.size]
+            new_owners = np.empty(capacity, dtype=np.int64)
+            new_owners[: self.size] = self.owners[: self.size]
+            self.embeddings, self.owners = new_embeddings, new_owners
+
+        self.embeddings[self.size : self.size + n_new] = embeddings
+        self.owners[self.size : self.size + n_new] = owners
+        self.size += n_new
+
+    def remove(self, owner: int):
+        """Removes the embeddings of a memory, and renumbers the memories after it"""
+        owners = self.current_owners
+        keep = owners != owner
+        n_kept = np.count_nonzero(keep)
+        if n_kept < self.size:
+            self.embeddings[:n_kept] = self.embeddings[: self.size][keep]
+            self.owners[:n_kept] = owners[keep]
+            self.size = n_kept
+        owners = self.current_owners
+        owners[owners > owner] -= 1
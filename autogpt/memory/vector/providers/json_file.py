@@ -1,25 +1,51 @@
 from __future__ import annotations
 
+import os
+import struct
 from pathlib import Path
-from typing import Iterator
+from typing import Iterator, Sequence
 
+import numpy as np
 import orjson
 
 from autogpt.config import Config
 from autogpt.logs import logger
 
-from ..memory_item import MemoryItem
+from ..memory_item import MemoryItem, MemoryItemRelevance
+from ..utils import Embedding, get_embedding
 from .base import VectorMemoryProvider
 
 
 class JSONFileMemory(VectorMemoryProvider):
-    """Memory backend that stores memories in a JSON file"""
+    """
+    Memory backend that stores memories in an append-only JSON lines record log,
+    with their embeddings in a memory-mapped .npy file next to it.
+
+    Adding or discarding a memory only appends to these files. Discarded memories
+    keep taking up space until the index is compacted with `compact_index()`.
+    """
 
     SAVE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SERIALIZE_DATACLASS
 
     file_path: Path
+    """The record log: one JSON object per line, replayed in order on load"""
+    embeddings_path: Path
+    """The embeddings of all records in the log, in order, summary first"""
+    legacy_file_path: Path
+    """Index file of the previous single-JSON-document format, migrated on load"""
+
     memories: list[MemoryItem]
 
+    _embeddings: np.ndarray
+    """Contiguous float32 matrix with one row per summary/chunk embedding.
+    Only the first `_n_rows` rows are in use; the rest is preallocated capacity."""
+    _owners: np.ndarray
+    """Index into `memories` of the item that owns each row of `_embeddings`.
+    Rows of an item are contiguous, summary first, so this array is sorted."""
+    _n_rows: int
+
+    _embeddings_file: _EmbeddingsFile
+
     def __init__(self, config: Config) -> None:
         """Initialize a class instance
 
@@ -30,19 +56,23 @@ class JSONFileMemory(VectorMemoryProvider):
             None
         """
         workspace_path = Path(config.workspace_path)
-        self.file_path = workspace_path / f"{config.memory_index}.json"
-        self.file_path.touch()
+        self.file_path = workspace_path / f"{config.memory_index}.jsonl"
+        self.embeddings_path = workspace_path / f"{config.memory_index}.npy"
+        self.legacy_file_path = workspace_path / f"{config.memory_index}.json"
         logger.debug(
             f"Initialized {__class__.__name__} with index path {self.file_path}"
         )
 
         self.memories = []
+        self._reset_embedding_matrix()
         try:
+            if self.legacy_file_path.is_file() and not self.file_path.exists():
+                self.migrate_legacy_index()
             self.load_index()
             logger.debug(f"Loaded {len(self.memories)} MemoryItems from file")
         except Exception as e:
             logger.warn(f"Could not load MemoryItems from file: {e}")
-            self.save_index()
+            self.clear()
 
     def __iter__(self) -> Iterator[MemoryItem]:
         return iter(self.memories)
@@ -54,34 +84,327 @@ class JSONFileMemory(VectorMemoryProvider):
         return len(self.memories)
 
     def add(self, item: MemoryItem):
-        self.memories.append(item)
         logger.debug(f"Adding item to memory: {item.dump()}")
-        self.save_index()
+        rows = _embedding_rows(item.e_summary, item.e_chunks)
+
+        # Write the embeddings before the record that refers to them, so that
+        # an interrupted write can't leave a record without embeddings.
+        self._embeddings_file.append(rows)
+        self._append_record({"op": "add", **_record_of(item)})
+
+        self._append_embeddings(rows, len(self.memories))
+        self.memories.append(item)
         return len(self.memories)
 
     def discard(self, item: MemoryItem):
         try:
-            self.remove(item)
-        except:
-            pass
+            i = self.memories.index(item)
+        except ValueError:
+            return
+
+        self._append_record({"op": "discard", "index": i})
+        del self.memories[i]
+        self._delete_embeddings(i)
 
     def clear(self):
         """Clears the data in memory."""
         self.memories.clear()
-        self.save_index()
+        self._reset_embedding_matrix()
+        self._write_index([], self._embeddings[:0])
+
+    def get_relevant(
+        self, query: str, k: int, config: Config
+    ) -> Sequence[MemoryItemRelevance]:
+        """
+        Returns the top-k most relevant memories for the given query.
+
+        Scores all summaries and chunks with a single matrix-vector product,
+        reduces them to a max score per memory and selects the top k with
+        `np.argpartition`, so only the k results are turned into objects.
+        """
+        if len(self) < 1 or k < 1:
+            return []
+
+        logger.debug(
+            f"Searching for {k} relevant memories for query '{query}'; "
+            f"{len(self)} memories in index"
+        )
+
+        e_query = np.asarray(get_embedding(query, config), dtype=np.float32)
+        scores = self._embeddings[: self._n_rows] @ e_query
+
+        offsets = self._item_offsets()
+        item_scores = np.maximum.reduceat(scores, offsets)
+        top_k = self._top_k(item_scores, k)
+
+        ends = np.append(offsets[1:], self._n_rows)
+        return [
+            MemoryItemRelevance(
+                memory_item=self.memories[i],
+                for_query=query,
+                summary_relevance_score=scores[offsets[i]],
+                chunk_relevance_scores=scores[offsets[i] + 1 : ends[i]],
+            )
+            for i in top_k
+        ]
+
+    def score_memories_for_relevance(
+        self, for_query: str, config: Config
+    ) -> Sequence[MemoryItemRelevance]:
+        return self.get_relevant(for_query, len(self), config)
+
+    def get_stats(self) -> tuple[int, int]:
+        return len(self), self._n_rows - len(self)
 
     def load_index(self):
-        """Loads all memories from the index file"""
+        """Loads all memories by replaying the record log"""
+        self.memories = []
+        self._reset_embedding_matrix()
+        self._embeddings_file = _EmbeddingsFile(self.embeddings_path)
         if not self.file_path.is_file():
             logger.debug(f"Index file '{self.file_path}' does not exist")
+            self.clear()
             return
-        with self.file_path.open("r") as f:
-            logger.debug(f"Loading memories from index file '{self.file_path}'")
-            json_index = orjson.loads(f.read())
-            for memory_item_dict in json_index:
-                self.memories.append(MemoryItem(**memory_item_dict))
 
-    def save_index(self):
+        logger.debug(f"Loading memories from index file '{self.file_path}'")
+        stored_embeddings = self._embeddings_file.load()
+        n_rows_read = 0
+        with self.file_path.open("r+b") as f:
+            for line_no, line in enumerate(iter(f.readline, b""), start=1):
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # Only the last record can be incomplete, e.g. after a crash.
+                    # Cut it off so the next record is appended on a new line.
+                    if not line.endswith(b"\n"):
+                        logger.warn(
+                            f"Dropping incomplete record at end of '{self.file_path}'"
+                        )
+                        f.truncate(f.tell() - len(line))
+                        break
+                    raise ValueError(f"Invalid record on line {line_no}")
+
+                match record.pop("op"):
+                    case "add":
+                        n_rows = 1 + len(record["chunks"])
+                        if n_rows_read + n_rows > len(stored_embeddings):
+                            raise ValueError(
+                                f"Record on line {line_no} has no stored embeddings"
+                            )
+                        rows = stored_embeddings[n_rows_read : n_rows_read + n_rows]
+                        n_rows_read += n_rows
+
+                        item = MemoryItem(
+                            **record, e_summary=rows[0], e_chunks=list(rows[1:])
+                        )
+                        self._append_embeddings(rows, len(self.memories))
+                        self.memories.append(item)
+                    case "discard":
+                        del self.memories[record["index"]]
+                        self._delete_embeddings(record["index"])
+                    case op:
+                        raise ValueError(f"Unknown operation '{op}' on line {line_no}")
+
+        # Rows without a record are left over from an interrupted add();
+        # the next add() will overwrite them.
+        self._embeddings_file.n_rows = n_rows_read
+
+    def compact_index(self):
+        """
+        Rewrites the index files to contain only the current memories,
+        reclaiming the space taken up by discarded memories.
+        """
+        logger.debug(f"Compacting memory index {self.file_path}")
+        self._write_index(self.memories, self._embeddings[: self._n_rows])
+        self.load_index()
+
+    def migrate_legacy_index(self):
+        """Converts a JSON index file of the previous format to the current format"""
+        logger.info(
+            f"Migrating memory index '{self.legacy_file_path}' to new format "
+            f"'{self.file_path}'"
+        )
+        json_index = orjson.loads(self.legacy_file_path.read_bytes() or b"[]")
+        memories = [MemoryItem(**memory_item_dict) for memory_item_dict in json_index]
+        embeddings = [_embedding_rows(m.e_summary, m.e_chunks) for m in memories]
+        self._write_index(
+            memories,
+            np.concatenate(embeddings)
+            if embeddings
+            else np.empty((0, 0), dtype=np.float32),
+        )
+        self.legacy_file_path.rename(self.legacy_file_path.with_suffix(".json.bak"))
+
+    def _write_index(self, memories: list[MemoryItem], embeddings: np.ndarray):
+        """(Re)writes the index files in one go, replacing the existing files"""
         logger.debug(f"Saving memory index to file {self.file_path}")
-        with self.file_path.open("wb") as f:
-            return f.write(orjson.dumps(self.memories, option=self.SAVE_OPTIONS))
+        if hasattr(self, "_embeddings_file"):
+            # Detach the stored memories from the memory-mapped file before replacing it
+            for memory in self.memories:
+                memory.e_summary = np.array(memory.e_summary, dtype=np.float32)
+                memory.e_chunks = [
+                    np.array(e, dtype=np.float32) for e in memory.e_chunks
+                ]
+
+        _EmbeddingsFile.write(self.embeddings_path, embeddings)
+
+        tmp_path = self.file_path.with_suffix(".jsonl.tmp")
+        with tmp_path.open("wb") as f:
+            for memory in memories:
+                f.write(self._dump_record({"op": "add", **_record_of(memory)}))
+        os.replace(tmp_path, self.file_path)
+
+        self._embeddings_file = _EmbeddingsFile(self.embeddings_path)
+
+    def _append_record(self, record: dict):
+        with self.file_path.open("ab") as f:
+            f.write(self._dump_record(record))
+
+    def _dump_record(self, record: dict) -> bytes:
+        return orjson.dumps(
+            record, option=self.SAVE_OPTIONS | orjson.OPT_APPEND_NEWLINE
+        )
+
+    def _reset_embedding_matrix(self, dimensions: int = 0):
+        self._embeddings = np.empty((0, dimensions), dtype=np.float32)
+        self._owners = np.empty(0, dtype=np.int64)
+        self._n_rows = 0
+
+    def _append_embeddings(self, rows: np.ndarray, owner: int):
+        n_new = len(rows)
+
+        if self._n_rows == 0 and self._embeddings.shape[1] != rows.shape[1]:
+            self._reset_embedding_matrix(rows.shape[1])
+        elif rows.shape[1] != self._embeddings.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {rows.shape[1]} of new memory does not match "
+                f"dimension {self._embeddings.shape[1]} of the memory index"
+            )
+
+        # Grow geometrically so that a series of adds is amortized O(1) per row
+        if self._n_rows + n_new > len(self._embeddings):
+            capacity = max(2 * len(self._embeddings), self._n_rows + n_new, 64)
+            embeddings = np.empty(
+                (capacity, self._embeddings.shape[1]), dtype=np.float32
+            )
+            embeddings[: self._n_rows] = self._embeddings[: self._n_rows]
+            owners = np.empty(capacity, dtype=np.int64)
+            owners[: self._n_rows] = self._owners[: self._n_rows]
+            self._embeddings, self._owners = embeddings, owners
+
+        self._embeddings[self._n_rows : self._n_rows + n_new] = rows
+        self._owners[self._n_rows : self._n_rows + n_new] = owner
+        self._n_rows += n_new
+
+    def _delete_embeddings(self, owner: int):
+        start, end = self._item_rows(owner)
+        n_tail = self._n_rows - end
+
+        self._embeddings[start : start + n_tail] = self._embeddings[end : self._n_rows]
+        self._owners[start : start + n_tail] = self._owners[end : self._n_rows] - 1
+        self._n_rows -= end - start
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Returns the indices of the k highest scores, highest first"""
+        if k < len(scores):
+            top_k = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top_k = np.arange(len(scores))
+        return top_k[np.argsort(-scores[top_k], kind="stable")]
+
+    def _item_rows(self, owner: int) -> tuple[int, int]:
+        """Returns the range of rows in `_embeddings` that belong to a memory"""
+        start, end = np.searchsorted(self._owners[: self._n_rows], [owner, owner + 1])
+        return int(start), int(end)
+
+    def _item_offsets(self) -> np.ndarray:
+        """Returns the index of the first (summary) row of every memory"""
+        return np.searchsorted(
+            self._owners[: self._n_rows], np.arange(len(self.memories))
+        )
+
+
+class _EmbeddingsFile:
+    """
+    A float32 .npy file with a fixed-size header, so rows can be appended in place.
+    Readable with `np.load`.
+    """
+
+    HEADER_SIZE = 128
+    MAGIC = b"\x93NUMPY\x01\x00"
+
+    path: Path
+    n_rows: int
+    dimensions: int
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.n_rows, self.dimensions = 0, 0
+        if path.is_file() and path.stat().st_size >= self.HEADER_SIZE:
+            with path.open("rb") as f:
+                np.lib.format.read_magic(f)
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+                if f.tell() != self.HEADER_SIZE or dtype != np.float32:
+                    raise ValueError(f"'{path}' is not a valid embeddings file")
+            self.n_rows, self.dimensions = shape
+
+    def load(self) -> np.ndarray:
+        """Returns a read-only memory map of the stored embeddings"""
+        if self.n_rows == 0:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return np.memmap(
+            self.path,
+            dtype="<f4",
+            mode="r",
+            offset=self.HEADER_SIZE,
+            shape=(self.n_rows, self.dimensions),
+        )
+
+    def append(self, rows: np.ndarray):
+        if self.n_rows == 0:
+            self.dimensions = rows.shape[1]
+        with self.path.open("r+b" if self.path.is_file() else "w+b") as f:
+            # Anything after the last row in the header is left over from an
+            # interrupted append and is overwritten
+            f.seek(self.HEADER_SIZE + self.n_rows * self.dimensions * 4)
+            f.write(rows.astype("<f4", copy=False).tobytes())
+            f.flush()
+            f.seek(0)
+            f.write(self._header(self.n_rows + len(rows), self.dimensions))
+        self.n_rows += len(rows)
+
+    @classmethod
+    def write(cls, path: Path, embeddings: np.ndarray):
+        tmp_path = path.with_suffix(".npy.tmp")
+        with tmp_path.open("wb") as f:
+            f.write(cls._header(*embeddings.shape))
+            f.write(embeddings.astype("<f4", copy=False).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _header(cls, n_rows: int, dimensions: int) -> bytes:
+        header = (
+            "{'descr': '<f4', 'fortran_order': False, "
+            f"'shape': ({n_rows}, {dimensions}), }}"
+        )
+        header = header.ljust(cls.HEADER_SIZE - len(cls.MAGIC) - 2 - 1) + "\n"
+        return cls.MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def _record_of(item: MemoryItem) -> dict:
+    return {
+        "raw_content": item.raw_content,
+        "summary": item.summary,
+        "chunks": item.chunks,
+        "chunk_summaries": item.chunk_summaries,
+        "metadata": item.metadata,
+    }
+
+
+def _embedding_rows(e_summary: Embedding, e_chunks: list[Embedding]) -> np.ndarray:
+    rows = np.empty((1 + len(e_chunks), len(e_summary)), dtype=np.float32)
+    rows[0] = e_summary
+    if e_chunks:
+        rows[1:] = e_chunks
+    return rows
@@ -4,9 +4,12 @@ import numpy as np
 
 from autogpt.config import Config
 from autogpt.llm.base import TText
-from autogpt.llm.providers import openai as iopenai
+from autogpt.llm.utils import count_string_tokens_batch
 from autogpt.logs import logger
 
+from .embedding_batcher import get_embedding_batcher
+from .embedding_cache import get_embedding_cache
+
 Embedding = list[np.float32] | np.ndarray[Any, np.dtype[np.float32]]
 """Embedding vector"""
 
@@ -41,25 +44,33 @@ def get_embedding(
         input = [text.replace("\n", " ") for text in input]
 
     model = config.embedding_model
-    if config.use_azure:
-        kwargs = {"engine": config.get_azure_deployment_id_for_model(model)}
-    else:
-        kwargs = {"model": model}
-
-    logger.debug(
-        f"Getting embedding{f's for {len(input)} inputs' if multiple else ''}"
-        f" with model '{model}'"
-        + (f" via Azure deployment '{kwargs['engine']}'" if config.use_azure else "")
-    )
-
-    embeddings = iopenai.create_embedding(
-        input,
-        **kwargs,
-        api_key=config.openai_api_key,
-    ).data
+    inputs = input if multiple else [input]
+    embeddings: list[Embedding | None] = [None] * len(inputs)
+    cache = get_embedding_cache(config)
+    if cache is not None:
+        embeddings = cache.get_many(model, inputs)
+        logger.debug(
+            f"Embedding cache: {sum(e is not None for e in embeddings)}"
+            f"/{len(inputs)} hits ({cache.hits} hits, {cache.misses} misses in total)"
+        )
+
+    misses = [i for i, e in enumerate(embeddings) if e is None]
+    if misses:
+        missing_inputs = [inputs[i] for i in misses]
+        if isinstance(missing_inputs[0], str):
+            token_counts = count_string_tokens_batch(missing_inputs, model)
+        else:
+            token_counts = [len(tokens) for tokens in missing_inputs]
+
+        new_embeddings = get_embedding_batcher(config).embed(
+            missing_inputs, token_counts
+        )
+        for i, embedding in zip(misses, new_embeddings):
+            embeddings[i] = embedding
+
+        if cache is not None:
+            cache.put_many(model, missing_inputs, new_embeddings)
 
     if not multiple:
-        return embeddings[0]["embedding"]
-
-    embeddings = sorted(embeddings, key=lambda x: x["index"])
-    return [d["embedding"] for d in embeddings]
+        return embeddings[0]
+    return embeddings
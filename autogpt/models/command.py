@@ -30,10 +30,15 @@ class Command:
         self.enabled = enabled
         self.disabled_reason = disabled_reason
 
+    def is_enabled(self, config: Optional[Config] = None) -> bool:
+        """Whether the command is enabled, for the given config if that decides it"""
+        if callable(self.enabled):
+            return config is None or bool(self.enabled(config))
+        return bool(self.enabled)
+
     def __call__(self, *args, **kwargs) -> Any:
-        if hasattr(kwargs, "config") and callable(self.enabled):
-            self.enabled = self.enabled(kwargs["config"])
-        if not self.enabled:
+        config = getattr(kwargs.get("agent"), "config", kwargs.get("config"))
+        if not self.is_enabled(config):
             if self.disabled_reason:
                 return f"Command '{self.name}' is disabled: {self.disabled_reason}"
             return f"Command '{self.name}' is disabled"
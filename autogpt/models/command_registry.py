@@ -1,10 +1,68 @@
+from __future__ import annotations
+
+import functools
 import importlib
 import inspect
-from typing import Any, Callable
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
 
 from autogpt.command_decorator import AUTO_GPT_COMMAND_IDENTIFIER
 from autogpt.logs import logger
 from autogpt.models.command import Command
+from autogpt.models.command_parameter import CommandParameter
+
+if TYPE_CHECKING:
+    from autogpt.config import Config
+    from autogpt.llm.providers.openai import OpenAIFunctions
+
+COMMAND_MANIFEST_FILE = Path(__file__).parent.parent / "commands" / "manifest.json"
+"""The commands of the built-in command modules, see build_command_manifest"""
+
+COMMAND_SYNONYMS = {
+    "write_file": "write_to_file",
+    "create_file": "write_to_file",
+    "search": "google",
+}
+"""Common/known hallucinations of command names, and the commands they mean"""
+
+
+class LazyCommand(Command):
+    """
+    A command that is registered from the command manifest. The module that defines
+    it is only imported when the command is first called.
+    """
+
+    def __init__(
+        self,
+        module_name: str,
+        name: str,
+        description: str,
+        parameters: list[CommandParameter],
+        enabled: bool | Callable[[Config], bool] = True,
+        disabled_reason: Optional[str] = None,
+    ):
+        super().__init__(
+            name=name,
+            description=description,
+            method=self._call_loaded_command,
+            parameters=parameters,
+            enabled=enabled,
+            disabled_reason=disabled_reason,
+        )
+        self.module_name = module_name
+
+    def load(self) -> Command:
+        """Imports the module of the command, if needed, and returns the command"""
+        commands = _module_commands(self.module_name)
+        if self.name not in commands:
+            raise KeyError(
+                f"Command '{self.name}' not found in module '{self.module_name}'."
+            )
+        return commands[self.name]
+
+    def _call_loaded_command(self, *args, **kwargs) -> Any:
+        return self.load()(*args, **kwargs)
 
 
 class CommandRegistry:
@@ -16,9 +74,14 @@ class CommandRegistry:
     """
 
     commands: dict[str, Command]
+    version: int
+    """Incremented whenever commands are registered, unregistered or reloaded"""
 
     def __init__(self):
         self.commands = {}
+        self.version = 0
+        self._openai_functions: tuple[int, OpenAIFunctions] | None = None
+        self._names: dict[str, str] = {}
 
     def _import_module(self, module_name: str) -> Any:
         return importlib.import_module(module_name)
@@ -32,10 +95,15 @@ class CommandRegistry:
                 f"Command '{cmd.name}' already registered and will be overwritten!"
             )
         self.commands[cmd.name] = cmd
+        self._names.setdefault(cmd.name.lower(), cmd.name)
+        self.version += 1
 
     def unregister(self, command_name: str):
         if command_name in self.commands:
             del self.commands[command_name]
+            if self._names.get(command_name.lower()) == command_name:
+                del self._names[command_name.lower()]
+            self.version += 1
         else:
             raise KeyError(f"Command '{command_name}' not found in registry.")
 
@@ -47,10 +115,28 @@ class CommandRegistry:
             reloaded_module = self._reload_module(module)
             if hasattr(reloaded_module, "register"):
                 reloaded_module.register(self)
+        self.version += 1
 
     def get_command(self, name: str) -> Callable[..., Any]:
         return self.commands[name]
 
+    def get(self, name: str) -> Command | None:
+        """
+        Returns the command with a name, where the name may differ in case from the
+        name of the command or be one of the COMMAND_SYNONYMS.
+
+        Args:
+            name (str): The name of the command, as given by the AI.
+
+        Returns:
+            Command | None: The command, or None if no command matches the name.
+        """
+        if name in self.commands:
+            return self.commands[name]
+        name = name.lower()
+        name = self._names.get(name) or self._names.get(COMMAND_SYNONYMS.get(name, ""))
+        return self.commands.get(name) if name else None
+
     def call(self, command_name: str, **kwargs) -> Any:
         if command_name not in self.commands:
             raise KeyError(f"Command '{command_name}' not found in registry.")
@@ -66,7 +152,20 @@ class CommandRegistry:
         ]
         return "\n".join(commands_list)
 
-    def import_commands(self, module_name: str) -> None:
+    def openai_functions(self) -> OpenAIFunctions:
+        """
+        Returns the specs of all registered `Command` objects as OpenAI functions.
+        They are built once, and again after the commands have changed.
+        """
+        from autogpt.llm.providers.openai import OpenAIFunctions
+
+        if self._openai_functions is None or self._openai_functions[0] != self.version:
+            functions = OpenAIFunctions.from_commands(self.commands.values())
+            logger.debug(f"Function dicts: {functions.payload}")
+            self._openai_functions = (self.version, functions)
+        return self._openai_functions[1]
+
+    def import_commands(self, module_name: str, lazy: bool = False) -> None:
         """
         Imports the specified Python module containing command plugins.
 
@@ -77,20 +176,137 @@ class CommandRegistry:
 
         Args:
             module_name (str): The name of the module to import for command plugins.
+            lazy (bool): If the module is in the command manifest, register its
+                commands from the manifest as `LazyCommand` objects, and only import
+                the module when one of them is first called. Defaults to False.
         """
+        manifest = load_command_manifest() if lazy else {}
+        if module_name in manifest:
+            for spec in manifest[module_name]:
+                self.register(
+                    LazyCommand(
+                        module_name=module_name,
+                        name=spec["name"],
+                        description=spec["description"],
+                        parameters=[
+                            CommandParameter(**parameter)
+                            for parameter in spec["parameters"]
+                        ],
+                        enabled=_enabled_from_manifest(spec["enabled"]),
+                        disabled_reason=spec["disabled_reason"],
+                    )
+                )
+            return
 
         module = importlib.import_module(module_name)
 
-        for attr_name in dir(module):
-            attr = getattr(module, attr_name)
-            # Register decorated functions
-            if hasattr(attr, AUTO_GPT_COMMAND_IDENTIFIER) and getattr(
-                attr, AUTO_GPT_COMMAND_IDENTIFIER
-            ):
-                self.register(attr.command)
-            # Register command classes
-            elif (
-                inspect.isclass(attr) and issubclass(attr, Command) and attr != Command
-            ):
-                cmd_instance = attr()
-                self.register(cmd_instance)
+        for cmd in _find_commands(module):
+            self.register(cmd)
+
+
+def _find_commands(module: Any) -> Iterable[Command]:
+    for attr_name in dir(module):
+        attr = getattr(module, attr_name)
+        # Decorated functions
+        if hasattr(attr, AUTO_GPT_COMMAND_IDENTIFIER) and getattr(
+            attr, AUTO_GPT_COMMAND_IDENTIFIER
+        ):
+            yield attr.command
+        # Command classes
+        elif inspect.isclass(attr) and issubclass(attr, Command) and attr != Command:
+            yield attr()
+
+
+@functools.lru_cache(maxsize=None)
+def _module_commands(module_name: str) -> dict[str, Command]:
+    module = importlib.import_module(module_name)
+    return {cmd.name: cmd for cmd in _find_commands(module)}
+
+
+@functools.lru_cache(maxsize=None)
+def load_command_manifest() -> dict[str, list[dict[str, Any]]]:
+    """Returns the command manifest, or an empty one if there is no manifest file"""
+    try:
+        with open(COMMAND_MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def build_command_manifest(module_names: list[str]) -> dict[str, list[dict[str, Any]]]:
+    """
+    Imports command modules and describes their commands, so that the commands can
+    be registered without importing the modules. If a command is enabled depending
+    on the config, the manifest names the config options that it requires, so that
+    they are still checked against the config of the run.
+
+    Args:
+        module_names (list[str]): The names of the command modules.
+
+    Returns:
+        dict: The description of the commands of each module.
+    """
+    manifest = {}
+    for module_name in module_names:
+        commands = _find_commands(importlib.import_module(module_name))
+        manifest[module_name] = [
+            {
+                "name": cmd.name,
+                "description": cmd.description,
+                "parameters": [
+                    {
+                        "name": param.name,
+                        "type": param.type,
+                        "description": param.description,
+                        "required": param.required,
+                    }
+                    for param in cmd.parameters
+                ],
+                "enabled": _enabled_to_manifest(cmd),
+                "disabled_reason": cmd.disabled_reason,
+            }
+            for cmd in commands
+        ]
+    return manifest
+
+
+class _ConfigOptionRecorder:
+    """A stand-in for the config that records which options are read, which are
+    all set unless they are in `unset`"""
+
+    def __init__(self, unset: Iterable[str] = ()) -> None:
+        self.unset = set(unset)
+        self.options: list[str] = []
+
+    def __getattr__(self, name: str) -> Optional[str]:
+        self.options.append(name)
+        return None if name in self.unset else name
+
+
+def _enabled_to_manifest(cmd: Command) -> bool | dict[str, list[str]]:
+    """Describes `enabled` of a command as a bool, or as the config options that
+    must all be set for the command to be enabled"""
+    if not callable(cmd.enabled):
+        return bool(cmd.enabled)
+    recorder = _ConfigOptionRecorder()
+    enabled = cmd.enabled(recorder)
+    options = list(dict.fromkeys(recorder.options))
+    if not (
+        options
+        and enabled
+        and not any(cmd.enabled(_ConfigOptionRecorder([o])) for o in options)
+    ):
+        raise ValueError(
+            f"Command '{cmd.name}' can't be described in the command manifest:"
+            " `enabled` must be a bool or require config options to be set."
+        )
+    return {"config_options": options}
+
+
+def _enabled_from_manifest(
+    enabled: bool | dict[str, list[str]]
+) -> bool | Callable[[Config], bool]:
+    if isinstance(enabled, dict):
+        options = enabled["config_options"]
+        return lambda config: all(getattr(config, option) for option in options)
+    return enabled
@@ -1,17 +1,49 @@
 """Text processing functions"""
+import contextvars
+import functools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
 from typing import Optional
 
 import spacy
-import tiktoken
 
 from autogpt.config import Config
 from autogpt.llm.base import ChatSequence
 from autogpt.llm.providers.openai import OPEN_AI_MODELS
-from autogpt.llm.utils import count_string_tokens, create_chat_completion
+from autogpt.llm.utils import count_string_tokens, create_chat_completion, get_encoding
 from autogpt.logs import logger
 from autogpt.utils import batch
 
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_sentence_splitter(model_name: str) -> spacy.language.Language:
+    """Load a spaCy pipeline that only does sentence segmentation
+
+    The pipeline is loaded once per process. Only the components needed for
+    sentence boundaries are kept: the fast `senter` if the model has one, else the
+    dependency parser, and a rule-based sentencizer for anything left unsegmented.
+    """
+    logger.debug(f"Loading spaCy model '{model_name}' for sentence segmentation")
+    nlp = spacy.load(model_name)
+
+    needed = {"sentencizer"}
+    if "senter" in nlp.component_names:
+        needed.add("senter")
+    elif "parser" in nlp.component_names:
+        needed.update(("tok2vec", "parser"))
+    for name in nlp.component_names:
+        if name in needed:
+            nlp.enable_pipe(name)
+        else:
+            nlp.disable_pipe(name)
+    if "sentencizer" not in nlp.pipe_names:
+        nlp.add_pipe("sentencizer")
+    return nlp
+
 
 def _max_chunk_length(model: str, max: Optional[int] = None) -> int:
     model_max_input_tokens = OPEN_AI_MODELS[model].max_tokens - 1
@@ -44,7 +76,7 @@ def chunk_content(
 
     max_chunk_length = max_chunk_length or _max_chunk_length(for_model)
 
-    tokenizer = tiktoken.encoding_for_model(for_model)
+    tokenizer = get_encoding(for_model)
 
     tokenized_text = tokenizer.encode(content)
     total_length = len(tokenized_text)
@@ -120,29 +152,103 @@ def summarize_text(
         logger.debug(f"\n{'-'*16} SUMMARY {'-'*17}\n{summary}\n{'-'*42}\n")
         return summary.strip(), None
 
-    summaries: list[str] = []
     chunks = list(
         split_text(
             text, for_model=model, config=config, max_chunk_length=max_chunk_length
         )
     )
 
-    for i, (chunk, chunk_length) in enumerate(chunks):
-        logger.info(
-            f"Summarizing chunk {i + 1} / {len(chunks)} of length {chunk_length} tokens"
-        )
-        summary, _ = summarize_text(chunk, instruction)
-        summaries.append(summary)
-
+    summaries = summarize_chunks(
+        [chunk for chunk, _ in chunks], config, instruction=instruction
+    )
     logger.info(f"Summarized {len(chunks)} chunks")
 
-    summary, _ = summarize_text("\n\n".join(summaries))
+    summary, _ = summarize_text("\n\n".join(summaries), config)
 
     return summary.strip(), [
         (summaries[i], chunks[i][0]) for i in range(0, len(chunks))
     ]
 
 
+def summarize_chunks(
+    chunks: list[str],
+    config: Config,
+    instruction: Optional[str] = None,
+    question: Optional[str] = None,
+) -> list[str]:
+    """Summarize a number of text chunks concurrently
+
+    The chunks are summarized in a pool of `config.summarization_max_concurrency`
+    threads that is shared by the whole process, so concurrent callers don't add up
+    to more requests in flight. Summaries that are requested from inside the pool,
+    e.g. of a chunk that has to be chunked again, are done serially in the calling
+    thread. The rate of requests is limited by the RateLimiter in
+    create_chat_completion.
+
+    Args:
+        chunks (list[str]): The texts to summarize
+        config (Config): The config object
+        instruction (str): Additional instruction for summarization
+        question (str): Question to answer in the summaries
+
+    Returns:
+        list[str]: The summary of each chunk, in the same order as the chunks
+    """
+
+    def summarize(i: int, chunk: str) -> str:
+        logger.info(f"Summarizing chunk {i + 1} / {len(chunks)}")
+        summary, _ = summarize_text(
+            chunk, config, instruction=instruction, question=question
+        )
+        return summary
+
+    max_workers = config.summarization_max_concurrency
+    if min(len(chunks), max_workers) <= 1 or getattr(_worker, "in_pool", False):
+        return [summarize(i, chunk) for i, chunk in enumerate(chunks)]
+
+    # Run the summaries in the caller's context, so their usage is counted by the
+    # ApiManager of the caller's agent
+    context = contextvars.copy_context()
+    executor = _get_executor(max_workers)
+    futures = [
+        executor.submit(context.copy().run, summarize, i, chunk)
+        for i, chunk in enumerate(chunks)
+    ]
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+_worker = threading.local()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Returns the process-wide pool that chunks are summarized in, which is
+    replaced if the configured number of workers changes"""
+    global _executor, _executor_size
+    with _executor_lock:
+        if _executor is None or _executor_size != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers,
+                thread_name_prefix="summarize",
+                initializer=_mark_worker,
+            )
+            _executor_size = max_workers
+        return _executor
+
+
+def _mark_worker() -> None:
+    _worker.in_pool = True
+
+
 def split_text(
     text: str,
     for_model: str,
@@ -167,10 +273,14 @@ def split_text(
     """
 
     max_length = _max_chunk_length(for_model, max_chunk_length)
+    tokenizer = get_encoding(for_model)
 
     # flatten paragraphs to improve performance
+    paragraphs = [
+        paragraph.replace("\n", " ") for paragraph in _PARAGRAPH_BREAK.split(text)
+    ]
     text = text.replace("\n", " ")
-    text_length = count_string_tokens(text, for_model)
+    text_length = len(tokenizer.encode(text))
 
     if text_length < max_length:
         yield text, text_length
@@ -179,10 +289,14 @@ def split_text(
     n_chunks = ceil(text_length / max_length)
     target_chunk_length = ceil(text_length / n_chunks)
 
-    nlp: spacy.language.Language = spacy.load(config.browse_spacy_language_model)
-    nlp.add_pipe("sentencizer")
-    doc = nlp(text)
-    sentences = [sentence.text.strip() for sentence in doc.sents]
+    nlp = _load_sentence_splitter(config.browse_spacy_language_model)
+    sentences = [
+        sentence.text.strip()
+        for doc in nlp.pipe(paragraphs)
+        for sentence in doc.sents
+        if sentence.text.strip()
+    ]
+    sentence_lengths = [len(tokens) for tokens in tokenizer.encode_batch(sentences)]
 
     current_chunk: list[str] = []
     current_chunk_length = 0
@@ -192,7 +306,7 @@ def split_text(
     i = 0
     while i < len(sentences):
         sentence = sentences[i]
-        sentence_length = count_string_tokens(sentence, for_model)
+        sentence_length = sentence_lengths[i]
         expected_chunk_length = current_chunk_length + 1 + sentence_length
 
         if (
@@ -231,10 +345,9 @@ def split_text(
             current_chunk_length += sentence_length
 
         else:  # sentence longer than maximum length -> chop up and try again
-            sentences[i : i + 1] = [
-                chunk
-                for chunk, _ in chunk_content(sentence, for_model, target_chunk_length)
-            ]
+            pieces = list(chunk_content(sentence, for_model, target_chunk_length))
+            sentences[i : i + 1] = [piece for piece, _ in pieces]
+            sentence_lengths[i : i + 1] = [length for _, length in pieces]
             continue
 
         i += 1
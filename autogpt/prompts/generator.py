@@ -26,6 +26,7 @@ class PromptGenerator:
         self.performance_evaluation = []
         self.goals = []
         self.command_registry: CommandRegistry | None = None
+        self._command_index: dict[str, dict[str, Any]] = {}
         self.name = "Bob"
         self.role = "AI"
 
@@ -69,6 +70,21 @@ class PromptGenerator:
         }
 
         self.commands.append(command)
+        self._command_index.setdefault(command_label.lower(), command)
+        self._command_index.setdefault(command_name.lower(), command)
+
+    def get_command(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a command that was added with add_command by its label or name, ignoring
+        case.
+
+        Args:
+            name (str): The label or name of the command.
+
+        Returns:
+            dict | None: The command, or None if no command matches the name.
+        """
+        return self._command_index.get(name.lower())
 
     def _generate_command_string(self, command: Dict[str, Any]) -> str:
         """
@@ -103,7 +119,9 @@ class PromptGenerator:
         """
         self.performance_evaluation.append(evaluation)
 
-    def _generate_numbered_list(self, items: List[Any], item_type="list") -> str:
+    def _generate_numbered_list(
+        self, items: List[Any], item_type="list", config: Optional[Config] = None
+    ) -> str:
         """
         Generate a numbered list from given items based on the item_type.
 
@@ -121,7 +139,7 @@ class PromptGenerator:
                 command_strings += [
                     str(item)
                     for item in self.command_registry.commands.values()
-                    if item.enabled
+                    if item.is_enabled(config)
                 ]
             # terminate command is added manually
             command_strings += [self._generate_command_string(item) for item in items]
@@ -160,5 +178,5 @@ def generate_commands(self, config: Config) -> str:
         return ""
     return (
         "Commands:\n"
-        f"{self._generate_numbered_list(self.commands, item_type='command')}\n\n"
+        f"{self._generate_numbered_list(self.commands, 'command', config)}\n\n"
     )
@@ -1,9 +1,10 @@
 """A simple spinner module"""
 import itertools
-import sys
 import threading
 import time
 
+from autogpt.logs import console_output
+
 
 class Spinner:
     """A simple spinner class"""
@@ -38,9 +39,14 @@ class Spinner:
             time.sleep(self.delay)
 
     def print_message(self):
-        sys.stdout.write(f"\r{' ' * (len(self.message) + 2)}\r")
-        sys.stdout.write(f"{next(self.spinner)} {self.message}\r")
-        sys.stdout.flush()
+        # Frames would mix with the output that is still being written
+        if console_output.busy:
+            return
+        console_output.write(
+            f"\r{' ' * (len(self.message) + 2)}\r"
+            f"{next(self.spinner)} {self.message}\r",
+            end="",
+        )
 
     def __enter__(self):
         """Start the spinner"""
@@ -58,11 +64,16 @@ class Spinner:
             exc_value (Exception): The exception value.
             exc_traceback (Exception): The exception traceback.
         """
+        self.stop()
+
+    def stop(self) -> None:
+        """Stop the spinner before the end of its context, e.g. to print output"""
+        if self.spinner_thread is None:
+            return
         self.running = False
-        if self.spinner_thread is not None:
-            self.spinner_thread.join()
-        sys.stdout.write(f"\r{' ' * (len(self.message) + 2)}\r")
-        sys.stdout.flush()
+        self.spinner_thread.join()
+        self.spinner_thread = None
+        console_output.write(f"\r{' ' * (len(self.message) + 2)}\r", end="")
 
     def update_message(self, new_message, delay=0.1):
         """Update the spinner message
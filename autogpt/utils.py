@@ -1,5 +1,10 @@
+import asyncio
+import concurrent.futures
+import contextvars
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
 
 import requests
 import yaml
@@ -9,10 +14,12 @@ from prompt_toolkit import ANSI, PromptSession
 from prompt_toolkit.history import InMemoryHistory
 
 from autogpt.config import Config
-from autogpt.logs import logger
+from autogpt.logs import console_output, logger
 
 session = PromptSession(history=InMemoryHistory())
 
+T = TypeVar("T")
+
 
 def batch(iterable, max_batch_length: int, overlap: int = 0):
     """Batch data from iterable into slices of length N. The last batch may be shorter."""
@@ -23,6 +30,59 @@ def batch(iterable, max_batch_length: int, overlap: int = 0):
         yield iterable[i : i + max_batch_length]
 
 
+RUN_IN_THREAD_MAX_WORKERS = 32
+"""Number of threads that run blocking functions for the event loops"""
+
+_executor = ThreadPoolExecutor(RUN_IN_THREAD_MAX_WORKERS, thread_name_prefix="autogpt")
+
+
+def submit_to_thread(
+    func: Callable[..., T], *args: Any, **kwargs: Any
+) -> concurrent.futures.Future[T]:
+    """
+    Runs a blocking function in the thread pool that Auto-GPT shares, in a copy of
+    the current context, like asyncio.to_thread does.
+    """
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, func, *args, **kwargs)
+
+
+async def wait_for_thread(
+    future: concurrent.futures.Future[T], timeout: float | None = None
+) -> T:
+    """
+    Waits for a function from submit_to_thread without blocking the event loop.
+
+    A thread can't be interrupted, so if the waiting task is cancelled, this waits
+    for the function to return before it raises CancelledError; nothing the function
+    does happens after the caller has moved on. When the timeout expires, TimeoutError
+    is raised and the function keeps running.
+    """
+    waiter = asyncio.wrap_future(future)
+    try:
+        await asyncio.wait([waiter], timeout=timeout)
+    except asyncio.CancelledError:
+        future.cancel()  # only succeeds if the function hasn't started yet
+        while not waiter.done():
+            try:
+                await asyncio.wait([waiter])
+            except asyncio.CancelledError:
+                pass
+        raise
+    if not waiter.done():
+        waiter.cancel()
+        raise asyncio.TimeoutError()
+    return waiter.result()
+
+
+async def run_in_thread(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a blocking function in a thread and waits for its result without blocking
+    the event loop, see submit_to_thread and wait_for_thread.
+    """
+    return await wait_for_thread(submit_to_thread(func, *args, **kwargs))
+
+
 def clean_input(config: Config, prompt: str = "", talk=False):
     try:
         if config.chat_messages_enabled:
@@ -55,6 +115,8 @@ def clean_input(config: Config, prompt: str = "", talk=False):
 
         # ask for input, default when just pressing Enter is y
         logger.info("Asking user via keyboard...")
+        # The prompt must come after the output that is still being written
+        console_output.flush()
         answer = session.prompt(ANSI(prompt))
         return answer
     except KeyboardInterrupt: